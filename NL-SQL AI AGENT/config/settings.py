@@ -1,8 +1,17 @@
 # config/settings.py
 
 GROQ_API_KEY = ""
+LLM_MODEL = "llama-3.3-70b-versatile"
 QDRANT_URL = "" 
 QDRANT_API_KEY = ""
+QDRANT_COLLECTION_NAME = "my_documents"
+SCHEMA_EMBED_BATCH_SIZE = 32        # table schemas per embedding call during schema sync
+SCHEMA_RETRIEVER_K = 4              # schemas returned per vector lookup
+SCHEMA_SYNC_RETRY_INTERVAL = 300    # seconds before get_retriever retries a failed schema sync
+# "qdrant" (remote collection) or "local" (memory-mapped NumPy index on disk,
+# no network hop; fine for a few thousand tables)
+VECTOR_BACKEND = "qdrant"
+LOCAL_VECTOR_INDEX_DIR = "vector_index"   # relative to the project root
 DB_CREDENTIALS1 = {
     "user": "",
     "password": "",
@@ -10,3 +19,85 @@ DB_CREDENTIALS1 = {
     "port": "",
     "db_name": ""
 }
+
+# Long-lived agent workers (fullstack/4i_aiagent/agent_server.py)
+AGENT_SERVER_HOST = "127.0.0.1"
+AGENT_SERVER_PORT = 8765
+
+# Batch report packs (fullstack/4i_aiagent/run_batch.py)
+BATCH_CONCURRENCY = 8               # questions in flight at once
+
+# Schema metadata cache (utils/db.SchemaCache)
+SCHEMA_CACHE_TTL = 3600             # seconds before a table's DDL/sample rows are always refetched
+SCHEMA_FINGERPRINT_INTERVAL = 60    # seconds between pg_attribute fingerprint checks
+
+# Schema section of the SQL-generation prompt (utils/schema_compactor.py)
+SCHEMA_COMPACTION_ENABLED = True    # False sends full get_table_info output as before
+SCHEMA_PROMPT_TOKEN_BUDGET = 1500   # approximate tokens for DDL, join paths and sample rows
+SCHEMA_MIN_COLUMNS_PER_TABLE = 3    # best-ranked columns always kept besides keys
+SCHEMA_SAMPLE_ROWS = 3              # sample rows per table when the question names values; 0 disables
+
+# Local table resolver (utils/schema_index.py, core/nodes/extract_table.py)
+TABLE_SYNONYMS = {}                 # extra words per table, e.g. {"inventory_levels": ["stock", "on hand"]}
+TABLE_RESOLVER_REFRESH_INTERVAL = 300   # seconds between catalog re-reads
+TABLE_RESOLVER_MAX_TABLES = 3       # most tables the resolver returns for one question
+TABLE_RESOLVER_RELATIVE_CUTOFF = 0.6    # keep tables scoring at least this fraction of the best one
+TABLE_RESOLVER_USE_EMBEDDINGS = True    # blend in question/table embedding similarity
+TABLE_RESOLVER_EMBEDDING_WEIGHT = 0.3
+TABLE_RESOLVER_MIN_CONFIDENCE = 2.0     # best BM25 score below which the LLM extractor is used instead
+
+# Role privileges (core/nodes/check_permissions.py)
+PRIVILEGES_DB_NAME = "4iempdb"
+PERMISSION_CACHE_TTL = 300          # seconds a (designation, table) decision is trusted
+PERMISSION_CACHE_SIZE = 4096        # max cached (designation, table) pairs, LRU evicted
+PERMISSION_NOTIFY_CHANNEL = "role_privileges_changed"  # set to None to rely on the TTL only
+
+# Per-designation bundles of permissions, compact DDL and table embeddings
+# (utils/role_bundles.py); replace the per-request privileges query and schema reads
+ROLE_BUNDLES_ENABLED = True
+ROLE_BUNDLE_DIR = "role_bundles"    # relative to the project root
+ROLE_BUNDLE_CHECK_INTERVAL = 60     # seconds between privilege/fingerprint re-checks of a bundle
+ROLE_BUNDLE_TTL = 86400             # seconds before a bundle is always rebuilt
+ROLE_BUNDLE_VECTOR_CACHE_SIZE = 4096   # (table, fingerprint) embeddings kept in memory, LRU evicted
+
+# Database engines (utils/db.py); one pooled engine is shared per database name
+SUPPLY_DB_NAME = "supplydb1"
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30                # seconds to wait for a free pooled connection
+DB_STATEMENT_TIMEOUT_MS = 60000     # server-side statement_timeout, 0 disables it
+DB_SAMPLE_ROWS_IN_TABLE_INFO = 3
+
+# Semantic question -> SQL cache (core/nodes/semantic_cache.py)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.95     # min cosine similarity to reuse a past question's SQL
+SEMANTIC_CACHE_SIZE = 512           # max cached questions across all designations, LRU evicted
+
+# Result-set cache (core/nodes/execute_sql.py)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_TTL = 300              # default seconds a cached result may be served
+RESULT_CACHE_TABLE_TTLS = {}        # per-table overrides, e.g. {"inventory_levels": 30}
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Answer formatting (core/nodes/format_answer.py)
+ANSWER_MAX_TABLE_ROWS = 100         # rows rendered into the Markdown/HTML table
+ANSWER_NARRATIVE_ENABLED = False    # add an LLM-written narrative on top of the table
+ANSWER_NARRATIVE_SAMPLE_ROWS = 10   # rows the narrative LLM gets to see
+
+# Query execution limits (core/nodes/execute_sql.py)
+SQL_ROW_LIMIT = 5000                # rows fetched per query; the rest is reported as truncated
+SQL_FETCH_CHUNK_SIZE = 500          # rows per server-side cursor fetch / streamed chunk
+SQL_COUNT_TRUNCATED_ROWS = False    # run an extra COUNT(*) to report total_rows when truncated
+
+# Generated SQL validation (utils/sql_validation.py)
+SQL_ALLOWED_SCHEMA = "public"       # the only schema a table reference may be qualified with
+
+# EXPLAIN-based cost guard (core/nodes/guard_sql.py), keyed by designation.
+# Designations without an entry use "default"; missing keys fall back to it too.
+SQL_COST_BUDGETS = {
+    "default": {
+        "max_cost": 1_000_000,          # planner total cost above which a query is rejected
+        "max_rows": 100_000,            # estimated rows above which a LIMIT is added
+        "statement_timeout_ms": 30000,  # applied to EXPLAIN and to the query itself
+    },
+}
@@ -3,34 +3,78 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core.state import AgentState
 from langgraph.graph import StateGraph,END
-from core.nodes.extract_table import extract_table_and_operation
-from core.nodes.check_permissions import check_user_permissions
-from core.nodes.generate_sql import generate_sql_query
-from core.nodes.execute_sql import run_sql_query
-from core.nodes.format_answer import format_answer
+from langchain_core.runnables import RunnableLambda
+from utils.instrumentation import instrument_node
+from core.nodes.extract_table import extract_table_and_operation, aextract_table_and_operation
+from core.nodes.check_permissions import check_user_permissions, acheck_user_permissions
+from core.nodes.generate_sql import generate_sql_query, agenerate_sql_query
+from core.nodes.execute_sql import run_sql_query, arun_sql_query
+from core.nodes.format_answer import format_answer, aformat_answer
 from core.nodes.return_permission_denied import return_permission_denied
 from core.nodes.decide_next_step import decide_next_step
+from core.nodes.semantic_cache import (
+    lookup_semantic_cache, alookup_semantic_cache,
+    update_semantic_cache, aupdate_semantic_cache
+)
+from core.nodes.decide_cache_route import decide_cache_route
+from core.nodes.guard_sql import guard_sql_cost, aguard_sql_cost
+from core.nodes.decide_after_guard import decide_after_guard
+from core.nodes.retrieve_schema import retrieve_schema, aretrieve_schema
+
 
+def node(name, func, afunc=None):
+    """Instrumented graph node; I/O nodes carry both variants so app.invoke runs
+    the sync functions and app.ainvoke/abatch the async ones on one event loop."""
+    if afunc is None:
+        return instrument_node(name, func)
+    return RunnableLambda(instrument_node(name, func), afunc=instrument_node(name, afunc))
 
 workflow = StateGraph(AgentState)
-workflow.add_node("extract_table_and_operation", extract_table_and_operation)
-workflow.add_node("check_user_permissions", check_user_permissions)
-workflow.add_node("generate_sql_for_allowed", generate_sql_query)
-workflow.add_node("run_sql_query", run_sql_query)
-workflow.add_node("format_answer", format_answer)
-workflow.add_node("return_permission_denied", return_permission_denied)
-workflow.set_entry_point("extract_table_and_operation")
-workflow.add_edge("extract_table_and_operation", "check_user_permissions")
+for name, func, afunc in [
+    ("lookup_semantic_cache", lookup_semantic_cache, alookup_semantic_cache),
+    ("extract_table_and_operation", extract_table_and_operation, aextract_table_and_operation),
+    ("retrieve_schema", retrieve_schema, aretrieve_schema),
+    ("check_user_permissions", check_user_permissions, acheck_user_permissions),
+    ("generate_sql_for_allowed", generate_sql_query, agenerate_sql_query),
+    ("guard_sql_cost", guard_sql_cost, aguard_sql_cost),
+    ("run_sql_query", run_sql_query, arun_sql_query),
+    ("format_answer", format_answer, aformat_answer),
+    ("return_permission_denied", return_permission_denied, None),
+    ("update_semantic_cache", update_semantic_cache, aupdate_semantic_cache),
+]:
+    workflow.add_node(name, node(name, func, afunc))
+workflow.set_entry_point("lookup_semantic_cache")
+workflow.add_conditional_edges(
+    "lookup_semantic_cache",
+    decide_cache_route,
+    {
+        "extract_table_and_operation": "extract_table_and_operation",
+        "retrieve_schema": "retrieve_schema",
+        "check_user_permissions": "check_user_permissions"
+    }
+)
+# Wait for both parallel branches before checking permissions
+workflow.add_edge(["extract_table_and_operation", "retrieve_schema"], "check_user_permissions")
 workflow.add_conditional_edges(
     "check_user_permissions",
     decide_next_step,
     {
         "generate_sql_for_allowed": "generate_sql_for_allowed",
+        "guard_sql_cost": "guard_sql_cost",
         "return_permission_denied": "return_permission_denied"
     }
 )
-workflow.add_edge("generate_sql_for_allowed", "run_sql_query")
-workflow.add_edge("run_sql_query", "format_answer")
+workflow.add_edge("generate_sql_for_allowed", "guard_sql_cost")
+workflow.add_conditional_edges(
+    "guard_sql_cost",
+    decide_after_guard,
+    {
+        "run_sql_query": "run_sql_query",
+        "end": END
+    }
+)
+workflow.add_edge("run_sql_query", "update_semantic_cache")
+workflow.add_edge("update_semantic_cache", "format_answer")
 workflow.add_edge("format_answer", END)
 workflow.add_edge("return_permission_denied", END)
 app = workflow.compile()
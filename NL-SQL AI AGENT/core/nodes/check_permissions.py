@@ -1,78 +1,114 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
-import re
-from utils.db import get_db_connection
+import asyncio
+import threading
+from utils.db import get_engine, get_async_engine, listen
+from utils.cache import TTLCache
+from utils.role_bundles import get_role_bundle, invalidate_role_bundle
+from utils.instrumentation import timed
 from sqlalchemy import text
 from core.state import AgentState
-from typing import Dict
-def check_user_permissions(state: AgentState) -> AgentState:
-    # print("Checking user permissions...")
-    db_priv = get_db_connection("4iempdb")
-    designation = state["designation"]
-    tables_requested = state["tables_requested"]
-
-    if not tables_requested:
-        return {
-            **state,
-            "allowed_tables": [],
-            "forbidden_tables": [],
-            "permission_status": "full"
-        }
+from core.nodes.embeddings1time import get_embeddings
+from config.settings import (
+    PRIVILEGES_DB_NAME,
+    PERMISSION_CACHE_TTL,
+    PERMISSION_CACHE_SIZE,
+    PERMISSION_NOTIFY_CHANNEL,
+    ROLE_BUNDLES_ENABLED,
+)
 
-    # Convert tables_requested to PostgreSQL array literal
-    # e.g., {"inventory_levels", "products"}
-    from sqlalchemy import text
-
-# This converts Python list to a SQL-compatible list
-    pg_array = tables_requested  # Just a list like ["inventory_levels"]
-
-    permission_query = text("""
-    SELECT 
-        table_name,
-        can_create,
-        can_read,
-        can_update,
-        can_delete
-    FROM role_privileges
-    WHERE role_name = :role_name
-    AND table_name = ANY(:table_list)
-    """)
+# Keyed by (designation, table_name). Tables without a role_privileges row are
+# cached as NO_PRIVILEGES so repeated denials don't hit the database either.
+#
+# Changes to role_privileges are pushed to the cache through LISTEN/NOTIFY once
+# this trigger is installed in the privileges database:
+#
+#   CREATE OR REPLACE FUNCTION notify_role_privileges_changed() RETURNS trigger AS $$
+#   BEGIN
+#       PERFORM pg_notify('role_privileges_changed', COALESCE(NEW.role_name, OLD.role_name));
+#       RETURN NULL;
+#   END;
+#   $$ LANGUAGE plpgsql;
+#
+#   CREATE TRIGGER role_privileges_changed
+#   AFTER INSERT OR UPDATE OR DELETE ON role_privileges
+#   FOR EACH ROW EXECUTE FUNCTION notify_role_privileges_changed();
+permission_cache = TTLCache(maxsize=PERMISSION_CACHE_SIZE, ttl=PERMISSION_CACHE_TTL)
+NO_PRIVILEGES = {"read": False, "write": False}
 
-    try:
-        # Pass `tables_requested` as a list, not a string
-        with db_priv._engine.connect() as conn:
-            result = conn.execute(
-                permission_query,
-                {"role_name": designation, "table_list": tables_requested}
-            )
-        
-        # Build dynamic permission dictionary
-        role_permissions = {}
-        for row in result:
-            table_name = row[0]
-            can_create = row[1]
-            can_read = row[2]
-            can_update = row[3]
-            can_delete = row[4]
-            role_permissions[table_name] = {
-                "read": can_read,
-                "write": can_create or can_update or can_delete
-            }
+_listener = None
+_listener_lock = threading.Lock()
 
+permission_query = text("""
+SELECT
+    table_name,
+    can_create,
+    can_read,
+    can_update,
+    can_delete
+FROM role_privileges
+WHERE role_name = :role_name
+AND table_name = ANY(:table_list)
+""")
+
+def invalidate_permissions(designation: str = None):
+    """Forget cached permissions for one designation, or for everyone."""
+    if designation is None:
+        permission_cache.invalidate()
+    else:
+        permission_cache.invalidate(lambda key: key[0] == designation)
+    invalidate_role_bundle(designation)
+
+def _bundle_permissions(designation: str) -> dict:
+    """The designation's permissions from its role bundle, or None to query them
+    (also while the bundle is still being built in the background)."""
+    try:
+        bundle = get_role_bundle(designation, get_embeddings())
     except Exception as e:
-        print(f"Error fetching permissions: {str(e)}")
-        return {
-            **state,
-            "allowed_tables": [],
-            "forbidden_tables": tables_requested,
-            "permission_status": "denied"
+        print(f"Role bundle unavailable for {designation}: {e}")
+        return None
+    return bundle["permissions"] if bundle else None
+
+def _ensure_listener():
+    global _listener
+    if not PERMISSION_NOTIFY_CHANNEL or _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = listen(PRIVILEGES_DB_NAME, PERMISSION_NOTIFY_CHANNEL, invalidate_permissions)
+
+def _split_cached(designation: str, tables_requested: list):
+    role_permissions = {}
+    uncached_tables = []
+    for table in tables_requested:
+        cached = permission_cache.get((designation, table))
+        if cached is None:
+            uncached_tables.append(table)
+        else:
+            role_permissions[table] = cached
+    return role_permissions, uncached_tables
+
+def _add_fetched(role_permissions: dict, rows, designation: str, uncached_tables: list):
+    # Build dynamic permission dictionary
+    for row in rows:
+        table_name = row[0]
+        can_create = row[1]
+        can_read = row[2]
+        can_update = row[3]
+        can_delete = row[4]
+        role_permissions[table_name] = {
+            "read": can_read,
+            "write": can_create or can_update or can_delete
         }
+    for table in uncached_tables:
+        permission_cache.set((designation, table), role_permissions.get(table, NO_PRIVILEGES))
 
+def _permission_result(state: AgentState, role_permissions: dict) -> AgentState:
     allowed_tables = []
     forbidden_tables = []
 
-    for table in tables_requested:
+    for table in state["tables_requested"]:
         if role_permissions.get(table, {}).get("read", False):
             allowed_tables.append(table)
         else:
@@ -85,5 +121,82 @@ def check_user_permissions(state: AgentState) -> AgentState:
         **state,
         "allowed_tables": allowed_tables,
         "forbidden_tables": forbidden_tables,
+        "writable_tables": [t for t in allowed_tables if role_permissions[t].get("write", False)],
         "permission_status": "partial" if partial_access else ("full" if not forbidden_tables else "denied")
     }
+
+def _no_tables_result(state: AgentState) -> AgentState:
+    return {
+        **state,
+        "allowed_tables": [],
+        "forbidden_tables": [],
+        "writable_tables": [],
+        "permission_status": "full"
+    }
+
+def _fetch_error_result(state: AgentState, error: Exception) -> AgentState:
+    print(f"Error fetching permissions: {str(error)}")
+    return {
+        **state,
+        "allowed_tables": [],
+        "forbidden_tables": state["tables_requested"],
+        "writable_tables": [],
+        "permission_status": "denied"
+    }
+
+def check_user_permissions(state: AgentState) -> AgentState:
+    # print("Checking user permissions...")
+    designation = state["designation"]
+    if not state["tables_requested"]:
+        return _no_tables_result(state)
+
+    _ensure_listener()
+    if ROLE_BUNDLES_ENABLED:
+        permissions = _bundle_permissions(designation)
+        if permissions is not None:
+            return _permission_result(state, permissions)
+
+    role_permissions, uncached_tables = _split_cached(designation, state["tables_requested"])
+    if uncached_tables:
+        try:
+            # Pass the tables as a list, psycopg2 adapts it to a PostgreSQL array
+            with timed("db", "permissions_query") as call, get_engine(PRIVILEGES_DB_NAME).connect() as conn:
+                rows = conn.execute(
+                    permission_query,
+                    {"role_name": designation, "table_list": uncached_tables}
+                ).fetchall()
+                call["rows"] = len(rows)
+        except Exception as e:
+            return _fetch_error_result(state, e)
+        _add_fetched(role_permissions, rows, designation, uncached_tables)
+
+    return _permission_result(state, role_permissions)
+
+async def acheck_user_permissions(state: AgentState) -> AgentState:
+    designation = state["designation"]
+    if not state["tables_requested"]:
+        return _no_tables_result(state)
+
+    _ensure_listener()
+    if ROLE_BUNDLES_ENABLED:
+        # Usually an in-memory hit; a (re)build queries and embeds synchronously
+        permissions = await asyncio.to_thread(_bundle_permissions, designation)
+        if permissions is not None:
+            return _permission_result(state, permissions)
+
+    role_permissions, uncached_tables = _split_cached(designation, state["tables_requested"])
+    if uncached_tables:
+        try:
+            with timed("db", "permissions_query") as call:
+                async with get_async_engine(PRIVILEGES_DB_NAME).connect() as conn:
+                    result = await conn.execute(
+                        permission_query,
+                        {"role_name": designation, "table_list": uncached_tables}
+                    )
+                    rows = result.fetchall()
+                call["rows"] = len(rows)
+        except Exception as e:
+            return _fetch_error_result(state, e)
+        _add_fetched(role_permissions, rows, designation, uncached_tables)
+
+    return _permission_result(state, role_permissions)
@@ -0,0 +1,10 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+from core.state import AgentState
+def decide_after_guard(state: AgentState) -> str:
+    # No SQL left means generation failed or the guard rejected it; the
+    # response already explains why.
+    if state.get("sql_query"):
+        return "run_sql_query"
+    return "end"
@@ -0,0 +1,10 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+from core.state import AgentState
+def decide_cache_route(state: AgentState) -> str:
+    # Cached questions still go through the permission check, just not extraction
+    if state.get("cache_hit"):
+        return "check_user_permissions"
+    # Schema retrieval only needs the question, so it runs alongside extraction
+    return ["extract_table_and_operation", "retrieve_schema"]
@@ -6,6 +6,11 @@ def decide_next_step(state: AgentState) -> str:
     status = state["permission_status"]
     if status == "denied":
         return "return_permission_denied"
+    # A semantic cache hit can skip SQL generation as long as the role still
+    # has exactly the access the cached query was generated for.
+    elif state.get("cache_hit") and state.get("sql_query") and \
+            state["allowed_tables"] == state.get("cached_allowed_tables"):
+        return "guard_sql_cost"
     elif status == "partial":
         return "generate_sql_for_allowed"
     else:
@@ -1,101 +1,230 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+import threading
+import time
+import uuid
 from langchain_ollama import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore
-from utils.db import get_db_connection
-from config.settings import QDRANT_API_KEY, QDRANT_URL
+from utils.db import get_db_connection, get_schema_cache
+from utils.vector_index import LocalVectorIndex, LocalSchemaRetriever
+from config.settings import (
+    QDRANT_API_KEY,
+    QDRANT_URL,
+    QDRANT_COLLECTION_NAME,
+    SCHEMA_EMBED_BATCH_SIZE,
+    SUPPLY_DB_NAME,
+    VECTOR_BACKEND,
+    LOCAL_VECTOR_INDEX_DIR,
+    SCHEMA_RETRIEVER_K,
+    SCHEMA_SYNC_RETRY_INTERVAL,
+)
+
+# Relative index directories are kept under the project root
+LOCAL_VECTOR_INDEX_PATH = os.path.join(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')),
+    LOCAL_VECTOR_INDEX_DIR
+)
 
 retriever = None
-db_supply = get_db_connection("supplydb1")
-from qdrant_client import QdrantClient
+embeddings = None
+client = None
+# When the last schema sync failed; requests don't retry it before
+# SCHEMA_SYNC_RETRY_INTERVAL has passed
+_sync_failed_at = 0.0
+_retriever_lock = threading.Lock()
+from qdrant_client import QdrantClient, models
+
+def get_embeddings():
+    global embeddings
+    if embeddings is None:
+        embeddings = OllamaEmbeddings(model="mistral:7b-instruct")
+    return embeddings
+
+def get_qdrant_client() -> QdrantClient:
+    global client
+    if client is None:
+        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, prefer_grpc=True)
+    return client
+
+def point_id(table: str) -> str:
+    # Stable per table, so re-embedding a table overwrites its old point
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{SUPPLY_DB_NAME}/{table}"))
+
+def _existing_points(qdrant: QdrantClient) -> dict:
+    """table -> list of (point id, stored DDL fingerprint) in the collection."""
+    points = {}
+    offset = None
+    while True:
+        batch, offset = qdrant.scroll(
+            collection_name=QDRANT_COLLECTION_NAME,
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        for point in batch:
+            metadata = (point.payload or {}).get("metadata") or {}
+            points.setdefault(metadata.get("table"), []).append((str(point.id), metadata.get("fingerprint")))
+        if offset is None:
+            return points
+
+def _current_schema():
+    tables = get_db_connection(SUPPLY_DB_NAME).get_usable_table_names()
+    schema_cache = get_schema_cache(SUPPLY_DB_NAME)
+    return tables, schema_cache, schema_cache.fingerprints(tables)
+
+def _embed_batches(tables: list, schema_cache):
+    """Yield (tables, schemas, vectors) for `tables`, SCHEMA_EMBED_BATCH_SIZE at a time."""
+    for start in range(0, len(tables), SCHEMA_EMBED_BATCH_SIZE):
+        batch = tables[start:start + SCHEMA_EMBED_BATCH_SIZE]
+        for table in batch:
+            schema_cache.invalidate(table)
+        schemas = schema_cache.get_tables_info(batch)
+        yield batch, schemas, get_embeddings().embed_documents([schemas[table] for table in batch])
+
+def sync_schema_embeddings() -> dict:
+    """Bring the configured vector backend in line with the current schema.
+
+    Each stored table carries its catalog fingerprint (utils/db.SchemaCache);
+    only tables that are new or whose fingerprint changed are re-embedded, in
+    batches, and dropped tables are removed.
+    """
+    if VECTOR_BACKEND == "local":
+        return _sync_local_index()
+    return _sync_qdrant()
+
+def _sync_local_index() -> dict:
+    tables, schema_cache, fingerprints = _current_schema()
+    index = LocalVectorIndex.load(LOCAL_VECTOR_INDEX_PATH)
+    stored = {entry["metadata"]["table"]: i for i, entry in enumerate(index.docstore)}
+
+    changed = [t for t in tables
+               if t not in stored or index.docstore[stored[t]]["metadata"].get("fingerprint") != fingerprints.get(t)]
+    dropped = [t for t in stored if t not in fingerprints and t not in tables]
+
+    docstore, vectors = {}, {}
+    for table in tables:
+        if table not in changed:
+            docstore[table] = index.docstore[stored[table]]
+            vectors[table] = index.vector(stored[table])
+    for batch, schemas, batch_vectors in _embed_batches(changed, schema_cache):
+        for table, vector in zip(batch, batch_vectors):
+            docstore[table] = {
+                "page_content": schemas[table],
+                "metadata": {"table": table, "fingerprint": fingerprints.get(table)}
+            }
+            vectors[table] = vector
+
+    if changed or dropped:
+        index.save([docstore[t] for t in tables], [vectors[t] for t in tables])
+    return {
+        "embedded": len(changed),
+        "deleted": len(dropped),
+        "dropped_tables": dropped,
+        "unchanged": len(tables) - len(changed),
+    }
+
+def _sync_qdrant() -> dict:
+    qdrant = get_qdrant_client()
+    tables, schema_cache, fingerprints = _current_schema()
+
+    exists = qdrant.collection_exists(QDRANT_COLLECTION_NAME)
+    existing = _existing_points(qdrant) if exists else {}
+
+    changed, stale_ids = [], []
+    for table in tables:
+        pid = point_id(table)
+        points = existing.pop(table, [])
+        # Points from the old full-rebuild upload have random ids; replace them
+        stale_ids += [other for other, _ in points if other != pid]
+        stored = [fingerprint for other, fingerprint in points if other == pid]
+        if not stored or stored[0] != fingerprints.get(table):
+            changed.append(table)
+    # Whatever is left belongs to dropped tables
+    dropped = [table for table in existing if table]
+    stale_ids += [pid for points in existing.values() for pid, _ in points]
+
+    for batch, schemas, vectors in _embed_batches(changed, schema_cache):
+        if not exists:
+            qdrant.create_collection(
+                collection_name=QDRANT_COLLECTION_NAME,
+                vectors_config=models.VectorParams(size=len(vectors[0]), distance=models.Distance.COSINE)
+            )
+            exists = True
+
+        qdrant.upsert(
+            collection_name=QDRANT_COLLECTION_NAME,
+            points=[
+                models.PointStruct(
+                    id=point_id(table),
+                    vector=vector,
+                    payload={
+                        "page_content": schemas[table],
+                        "metadata": {"table": table, "fingerprint": fingerprints.get(table)}
+                    }
+                )
+                for table, vector in zip(batch, vectors)
+            ]
+        )
+
+    if stale_ids:
+        qdrant.delete(
+            collection_name=QDRANT_COLLECTION_NAME,
+            points_selector=models.PointIdsList(points=stale_ids)
+        )
+
+    return {
+        "embedded": len(changed),
+        "deleted": len(stale_ids),
+        "dropped_tables": dropped,
+        "unchanged": len(tables) - len(changed),
+    }
+
+def _sync_with_backoff():
+    global _sync_failed_at
+    if time.time() - _sync_failed_at < SCHEMA_SYNC_RETRY_INTERVAL:
+        return
+    try:
+        sync = sync_schema_embeddings()
+        # print(f"Schema embeddings synced: {sync}")
+    except Exception as e:
+        # A failed sync leaves the stored index as it was; retrieval still
+        # works on the last synced schemas, so don't rebuild anything here.
+        # If there is nothing stored yet, building the retriever below fails
+        # and the next request comes back here; the backoff keeps each of
+        # those from starting another full sync.
+        _sync_failed_at = time.time()
+        print(f"Schema embedding sync failed, next attempt in {SCHEMA_SYNC_RETRY_INTERVAL}s: {e}")
 
 def get_retriever():
+    with _retriever_lock:
+        return _get_retriever()
+
+def _get_retriever():
     global retriever
     if retriever is not None:
         return retriever
 
-    ollama_emb = OllamaEmbeddings(model="mistral:7b-instruct")
-    url = QDRANT_URL  
-    api_key = QDRANT_API_KEY
+    _sync_with_backoff()
 
-    try:
-        qdrant = QdrantVectorStore.from_existing_collection(
-            embedding=ollama_emb,
-            url=url,
-            prefer_grpc=True,
-            api_key=api_key,
-            collection_name="my_documents",
-        )
-        # print("✅ Loaded existing Qdrant collection.")
-    except Exception as e:
-        # print(f"⚠️ Collection not found or error loading: {e}. Generating and uploading embeddings...")
-
-        table_names = db_supply.get_usable_table_names()
-        table_schemas = {table: db_supply.get_table_info([table]) for table in table_names}
-
-        documents = [
-            Document(page_content=schema, metadata={"table": table})
-            for table, schema in table_schemas.items()
-        ]
-
-        qdrant = QdrantVectorStore.from_documents(
-            documents,
-            embedding=ollama_emb,
-            url=url,
-            prefer_grpc=True,
-            api_key=api_key,
-            collection_name="my_documents",
+    if VECTOR_BACKEND == "local":
+        # In-process search over the memory-mapped index, no network hop
+        retriever = LocalSchemaRetriever(
+            index=LocalVectorIndex.load(LOCAL_VECTOR_INDEX_PATH),
+            embeddings=get_embeddings(),
+            k=SCHEMA_RETRIEVER_K
         )
-        # print("✅ Embeddings created and uploaded.")
+        return retriever
 
-    retriever = qdrant.as_retriever()
+    qdrant = QdrantVectorStore(
+        client=get_qdrant_client(),
+        collection_name=QDRANT_COLLECTION_NAME,
+        embedding=get_embeddings(),
+    )
+    retriever = qdrant.as_retriever(search_kwargs={"k": SCHEMA_RETRIEVER_K})
     return retriever
-#With FAISS
-# import sys
-# import os
-# sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
-
-# # Use FAISS from langchain_community
-
-# # Use OllamaEmbeddings from langchain_community
-# from langchain_community.embeddings import OllamaEmbeddings
-
-# from langchain_core.documents import Document
-
-# # Import your DB utility
-# from utils.db import get_db_connection
-
-# # Global retriever cache
-# retriever=None
-# db_supply = get_db_connection("supplydb1")
-# ollama_emb = OllamaEmbeddings(model="mistral:7b-instruct")
-
-# def get_retriever():
-#     global retriever, ollama_emb
-#     if retriever is not None:
-#         return retriever
-
-#     faiss_index_path = "faiss_inventory_schema.index"
-#     index_name = "inventory_schema"
-
-#     try:
-#         vectorstore = FAISS.load_local(
-#             folder_path=faiss_index_path,
-#             embeddings=ollama_emb,
-#             index_name=index_name
-#         )
-#         print("✅ Loaded existing FAISS collection.")
-#     except Exception as e:
-#         print(f"⚠️ FAISS index not found or error loading: {e}. Generating new embeddings...")
-#         table_names = db_supply.get_usable_table_names()
-#         table_schemas = {table: db_supply.get_table_info([table]) for table in table_names}
-#         documents = [Document(page_content=schema, metadata={"table": table}) for table, schema in table_schemas.items()]
-#         vectorstore = FAISS.from_documents(documents, ollama_emb)
-#         vectorstore.save_local(folder_path=faiss_index_path, index_name=index_name)
-#         print("✅ FAISS index created and saved.")
-
-#     retriever = vectorstore.as_retriever()
-#     return retriever
\ No newline at end of file
+
+if __name__ == "__main__":
+    # Schema-sync job: python core/nodes/embeddings1time.py
+    print(sync_schema_embeddings())
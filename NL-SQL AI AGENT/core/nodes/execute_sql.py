@@ -1,20 +1,267 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+import asyncio
 from core.state import AgentState
-from core.nodes.embeddings1time import db_supply
-
-def run_sql_query(state: AgentState) -> AgentState:
-    sql_query = state.get("sql_query")
-    # print(sql_query)
-    if not sql_query:
-        print("No SQL query found. Skipping execution.")
-        return {
-            **state,
-            "response": "No valid SQL query was generated."
-        }
+from langchain_core.runnables import RunnableConfig
+from sqlalchemy import text
+from utils.db import get_engine, get_async_engine, get_table_versions
+from utils.cache import TTLCache
+from utils.helpers import normalize_sql, extract_table_names
+from utils.sql_validation import parse_sql, SQLValidationError
+from utils.instrumentation import timed, record
+from core.nodes.guard_sql import (
+    get_sql_budget, set_statement_timeout, aset_statement_timeout, is_select, READ_ONLY_QUERY
+)
+from config.settings import (
+    SUPPLY_DB_NAME,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_TTL,
+    RESULT_CACHE_TABLE_TTLS,
+    RESULT_CACHE_MAX_BYTES,
+    SQL_ROW_LIMIT,
+    SQL_FETCH_CHUNK_SIZE,
+    SQL_COUNT_TRUNCATED_ROWS,
+)
+
+# Keyed by normalized SQL. Each entry remembers the change markers of the
+# tables it read and is only served while those markers are unchanged.
+result_cache = TTLCache(
+    maxsize=RESULT_CACHE_MAX_BYTES,
+    ttl=RESULT_CACHE_TTL,
+    weigher=lambda entry: len(str(entry["rows"]))
+)
+
+def _result_ttl(tables):
+    return min((RESULT_CACHE_TABLE_TTLS.get(t, RESULT_CACHE_TTL) for t in tables), default=RESULT_CACHE_TTL)
+
+def _take_chunk(rows, chunk):
+    """Append a fetched chunk without exceeding SQL_ROW_LIMIT; returns (chunk, truncated)."""
+    room = SQL_ROW_LIMIT - len(rows)
+    truncated = len(chunk) > room
+    chunk = [list(row) for row in chunk[:room]]
+    rows.extend(chunk)
+    return chunk, truncated
+
+def _execute(sql_query, on_rows=None, timeout_ms=None, read_only=True):
+    """Run the statement, keeping at most SQL_ROW_LIMIT rows of a SELECT.
+
+    SELECT rows come through a server-side cursor, SQL_FETCH_CHUNK_SIZE at a
+    time, and are handed to `on_rows(columns, chunk)` as they arrive. Writes
+    run plainly and report their row count (plus any RETURNING rows).
+    Returns (columns, rows, truncated, affected_rows); affected_rows is None
+    for a SELECT. With `read_only` the transaction is READ ONLY.
+    """
+    with get_engine(SUPPLY_DB_NAME).begin() as conn:
+        if read_only:
+            conn.execute(READ_ONLY_QUERY)
+        if timeout_ms:
+            set_statement_timeout(conn, timeout_ms)
+        if not is_select(sql_query):
+            result = conn.execute(text(sql_query))
+            columns = list(result.keys()) if result.returns_rows else []
+            rows = [list(row) for row in result.fetchall()] if result.returns_rows else []
+            return columns, rows, False, result.rowcount
+
+        result = conn.execute(
+            text(sql_query),
+            execution_options={"stream_results": True, "max_row_buffer": SQL_FETCH_CHUNK_SIZE}
+        )
+        if not result.returns_rows:
+            return [], [], False, None
+
+        columns = list(result.keys())
+        rows = []
+        truncated = False
+        while not truncated:
+            chunk = result.fetchmany(SQL_FETCH_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk, truncated = _take_chunk(rows, chunk)
+            if on_rows and chunk:
+                on_rows(columns, chunk)
+        result.close()
+        return columns, rows, truncated, None
+
+async def _aexecute(sql_query, on_rows=None, timeout_ms=None, read_only=True):
+    async with get_async_engine(SUPPLY_DB_NAME).begin() as conn:
+        if read_only:
+            await conn.execute(READ_ONLY_QUERY)
+        if timeout_ms:
+            await aset_statement_timeout(conn, timeout_ms)
+        if not is_select(sql_query):
+            result = await conn.execute(text(sql_query))
+            columns = list(result.keys()) if result.returns_rows else []
+            rows = [list(row) for row in result.fetchall()] if result.returns_rows else []
+            return columns, rows, False, result.rowcount
+
+        result = await conn.stream(text(sql_query))
+        columns = list(result.keys())
+        rows = []
+        truncated = False
+        async for chunk in result.partitions(SQL_FETCH_CHUNK_SIZE):
+            chunk, truncated = _take_chunk(rows, chunk)
+            if on_rows and chunk:
+                on_rows(columns, chunk)
+            if truncated:
+                break
+        await result.close()
+        return columns, rows, truncated, None
+
+def _count_query(sql_query):
+    return text(f"SELECT COUNT(*) FROM ({sql_query.strip().rstrip(';')}) AS counted")
+
+# Only truncated SELECTs are counted; the count re-runs them, so read-only too
+def _count_rows(sql_query):
+    with get_engine(SUPPLY_DB_NAME).connect() as conn:
+        conn.execute(READ_ONLY_QUERY)
+        return conn.execute(_count_query(sql_query)).scalar()
+
+async def _acount_rows(sql_query):
+    async with get_async_engine(SUPPLY_DB_NAME).connect() as conn:
+        await conn.execute(READ_ONLY_QUERY)
+        return (await conn.execute(_count_query(sql_query))).scalar()
+
+def _replay_rows(on_rows, columns, rows):
+    for start in range(0, len(rows), SQL_FETCH_CHUNK_SIZE):
+        on_rows(columns, rows[start:start + SQL_FETCH_CHUNK_SIZE])
+
+def _cache_key(sql_query):
+    # The parse is shared with generate_sql and guard_sql_cost
+    try:
+        return parse_sql(sql_query)["normalized"]
+    except SQLValidationError:
+        return normalize_sql(sql_query)
+
+def _on_rows(config):
+    # Streaming callers (run_agent.py --stream) pass a row callback in the config
+    return (config or {}).get("configurable", {}).get("on_rows")
+
+def _cache_lookup(state: AgentState, versions, on_rows):
+    """Return the cached result state if it is still current, else None."""
+    cached = result_cache.get(_cache_key(state["sql_query"]))
+    hit = cached is not None and cached["versions"] == versions
+    record("cache", "result_cache", cache_hit=hit)
+    if not hit:
+        return None
+    if on_rows:
+        _replay_rows(on_rows, cached["columns"], cached["rows"])
+    return {
+        **state,
+        "columns": cached["columns"],
+        "rows": cached["rows"],
+        "row_count": len(cached["rows"]),
+        "truncated": cached["truncated"],
+        "total_rows": cached["total_rows"],
+        "affected_rows": None,
+        "response": None,
+        "execution_error": None,
+        "result_cache_hit": True
+    }
+
+def _result_state(state: AgentState, tables, versions, columns, rows, truncated, total_rows,
+                  affected_rows=None) -> AgentState:
+    if versions is not None:
+        result_cache.set(
+            _cache_key(state["sql_query"]),
+            {
+                "columns": columns,
+                "rows": rows,
+                "truncated": truncated,
+                "total_rows": total_rows,
+                "versions": versions
+            },
+            ttl=_result_ttl(tables)
+        )
+    # format_answer renders the response from columns/rows
+    return {
+        **state,
+        "columns": columns,
+        "rows": rows,
+        "row_count": len(rows),
+        "truncated": truncated,
+        "total_rows": total_rows,
+        "affected_rows": affected_rows,
+        "response": None,
+        "execution_error": None,
+        "result_cache_hit": False
+    }
+
+def _error_state(state: AgentState, error: Exception) -> AgentState:
+    return {**state, "response": f"SQL Execution Error: {str(error)}", "execution_error": str(error)}
+
+def _statement_tables(sql_query):
+    try:
+        return parse_sql(sql_query)["tables"]
+    except SQLValidationError:
+        return extract_table_names(sql_query)
+
+def _tables_read(state: AgentState):
+    return sorted(set(_statement_tables(state["sql_query"])) | set(state.get("allowed_tables") or []))
+
+def _read_only(state: AgentState) -> bool:
+    """SELECTs, and statements on tables the role cannot write, run READ ONLY.
+
+    A plain SELECT can still write through functions such as setval(), which
+    the validator cannot see; Postgres refuses them in a read-only transaction.
+    """
+    sql_query = state["sql_query"]
+    writable = set(state.get("writable_tables") or [])
+    return is_select(sql_query) or not set(_statement_tables(sql_query)) <= writable
+
+def run_sql_query(state: AgentState, config: RunnableConfig = None) -> AgentState:
+    # decide_after_guard only routes here with SQL to run
+    sql_query = state["sql_query"]
+    on_rows = _on_rows(config)
+
+    tables = _tables_read(state)
+    versions = None
+    if RESULT_CACHE_ENABLED and is_select(sql_query):
+        try:
+            versions = get_table_versions(SUPPLY_DB_NAME, tables)
+        except Exception as e:
+            print(f"Could not read table versions, skipping result cache: {e}")
+        else:
+            cached_state = _cache_lookup(state, versions, on_rows)
+            if cached_state is not None:
+                return cached_state
+
+    try:
+        timeout_ms = get_sql_budget(state["designation"])["statement_timeout_ms"]
+        with timed("db", "execute_sql") as call:
+            columns, rows, truncated, affected_rows = _execute(sql_query, on_rows, timeout_ms, _read_only(state))
+            call["rows"] = len(rows)
+        total_rows = len(rows)
+        if truncated:
+            total_rows = _count_rows(sql_query) if SQL_COUNT_TRUNCATED_ROWS else None
+    except Exception as e:
+        return _error_state(state, e)
+    return _result_state(state, tables, versions, columns, rows, truncated, total_rows, affected_rows)
+
+async def arun_sql_query(state: AgentState, config: RunnableConfig = None) -> AgentState:
+    sql_query = state["sql_query"]
+    on_rows = _on_rows(config)
+
+    tables = _tables_read(state)
+    versions = None
+    if RESULT_CACHE_ENABLED and is_select(sql_query):
+        try:
+            versions = await asyncio.to_thread(get_table_versions, SUPPLY_DB_NAME, tables)
+        except Exception as e:
+            print(f"Could not read table versions, skipping result cache: {e}")
+        else:
+            cached_state = _cache_lookup(state, versions, on_rows)
+            if cached_state is not None:
+                return cached_state
+
     try:
-        result = db_supply.run(sql_query)
-        return {**state, "response": result}
+        timeout_ms = get_sql_budget(state["designation"])["statement_timeout_ms"]
+        with timed("db", "execute_sql") as call:
+            columns, rows, truncated, affected_rows = await _aexecute(sql_query, on_rows, timeout_ms, _read_only(state))
+            call["rows"] = len(rows)
+        total_rows = len(rows)
+        if truncated:
+            total_rows = await _acount_rows(sql_query) if SQL_COUNT_TRUNCATED_ROWS else None
     except Exception as e:
-        return {**state, "response": f"SQL Execution Error: {str(e)}"}
\ No newline at end of file
+        return _error_state(state, e)
+    return _result_state(state, tables, versions, columns, rows, truncated, total_rows, affected_rows)
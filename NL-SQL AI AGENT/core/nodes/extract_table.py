@@ -6,19 +6,39 @@ warnings.filterwarnings("ignore", category=LangChainDeprecationWarning)
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
-import os
+import asyncio
+import json
+import re
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
 from core.state import AgentState
-from config.settings import GROQ_API_KEY
-if "GROQ_API_KEY" not in os.environ:
-    os.environ["GROQ_API_KEY"] =GROQ_API_KEY
-llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.2)
-from langchain_community.chat_models import ChatOpenAI
+from core.nodes.embeddings1time import get_embeddings
+from core.nodes.semantic_cache import embed_question, aembed_question
+from utils.llm import get_llm
+from utils.instrumentation import timed
+from utils.schema_index import get_schema_index, detect_operation
+from config.settings import SUPPLY_DB_NAME, TABLE_RESOLVER_USE_EMBEDDINGS, TABLE_RESOLVER_MIN_CONFIDENCE
 
-def extract_table_and_operation(state: AgentState) -> AgentState:
-    # print("Extracting tables and operations...")
-    prompt = f"""
+def schema_index():
+    return get_schema_index(SUPPLY_DB_NAME, get_embeddings() if TABLE_RESOLVER_USE_EMBEDDINGS else None)
+
+def _resolve_locally(state: AgentState, vector) -> AgentState:
+    """Tables from the local schema index, or None when the LLM should decide."""
+    try:
+        with timed("local", "table_resolver") as call:
+            tables, confidence = schema_index().resolve(state["question"], vector)
+            call["confidence"] = round(confidence, 3)
+    except Exception as e:
+        print(f"Table resolver failed: {e}")
+        return None
+    if not tables or confidence < TABLE_RESOLVER_MIN_CONFIDENCE:
+        return None
+    return {
+        "tables_requested": tables,
+        "crud_operation": detect_operation(state["question"])
+    }
+
+def _extraction_prompt(state: AgentState) -> str:
+    return f"""
 You are a PostgreSQL expert. Based on the following question, identify:
 1. The Actual Table(s) involved in the user question.
 2. The type of operation (CREATE, READ, UPDATE, DELETE)
@@ -31,18 +51,63 @@ Only output a JSON object with these two keys:
 Question: {state['question']}
 """
 
+def _parse_extraction(content: str) -> AgentState:
     try:
-        response = llm.invoke([HumanMessage(content=prompt)])
-        parsed = eval(response.content)
+        match = re.search(r"\{.*\}", content, re.DOTALL)
+        parsed = json.loads(match.group(0) if match else content)
+        tables = parsed.get("tables", [])
+        try:
+            # Drop names the model made up; keep its answer if the catalog can't be read
+            tables = schema_index().known(tables)
+        except Exception as e:
+            print(f"Table name check failed: {e}")
+        # Runs in parallel with retrieve_schema, so only return this node's keys
         return {
-            **state,
-            "tables_requested": parsed.get("tables", []),
+            "tables_requested": tables,
             "crud_operation": parsed.get("operation", "").upper()
         }
     except Exception as e:
         print("Parsing error:", str(e))
         return {
-            **state,
             "tables_requested": [],
             "crud_operation": ""
-        }
\ No newline at end of file
+        }
+
+def extract_table_and_operation(state: AgentState) -> AgentState:
+    # print("Extracting tables and operations...")
+    vector = None
+    if TABLE_RESOLVER_USE_EMBEDDINGS:
+        try:
+            vector = embed_question(state["question"])
+        except Exception as e:
+            print(f"Question embedding failed: {e}")
+    resolved = _resolve_locally(state, vector)
+    if resolved is not None:
+        return resolved
+
+    # Low resolver confidence: fall back to asking the LLM
+    try:
+        response = get_llm(0.2).invoke([HumanMessage(content=_extraction_prompt(state))])
+    except Exception as e:
+        print("Extraction error:", str(e))
+        return {"tables_requested": [], "crud_operation": ""}
+    return _parse_extraction(response.content)
+
+async def aextract_table_and_operation(state: AgentState) -> AgentState:
+    vector = None
+    if TABLE_RESOLVER_USE_EMBEDDINGS:
+        try:
+            vector = await aembed_question(state["question"])
+        except Exception as e:
+            print(f"Question embedding failed: {e}")
+    # The first call reads the catalog and embeds every table; keep it off the loop
+    resolved = await asyncio.to_thread(_resolve_locally, state, vector)
+    if resolved is not None:
+        return resolved
+
+    try:
+        response = await get_llm(0.2).ainvoke([HumanMessage(content=_extraction_prompt(state))])
+    except Exception as e:
+        print("Extraction error:", str(e))
+        return {"tables_requested": [], "crud_operation": ""}
+    return _parse_extraction(response.content)
@@ -4,36 +4,82 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..
 from core.state import AgentState
 # from core.nodes.generate_sql import llm
 from langchain_core.messages import HumanMessage
-from config.settings import GROQ_API_KEY
-import os
-from langchain_groq import ChatGroq
-if "GROQ_API_KEY" not in os.environ:
-            os.environ["GROQ_API_KEY"] =GROQ_API_KEY
-llm = ChatGroq(
-    model_name="llama-3.3-70b-versatile",
-    temperature=0.7)
-def format_answer(state: AgentState) -> AgentState:
-    if not state["response"] or not isinstance(state["response"], str):
-        return state
+from config.settings import (
+    ANSWER_MAX_TABLE_ROWS,
+    ANSWER_NARRATIVE_ENABLED,
+    ANSWER_NARRATIVE_SAMPLE_ROWS,
+)
+from utils.formatting import to_markdown_table, to_html_table, summarize_result, column_aggregates
+from utils.llm import get_llm
 
-    answer_prompt = f"""
-    You are a data analyst assistant. Convert the SQL query results into a clear, human-readable answer.
+def _narrative_prompt(state: AgentState, summary: str) -> str:
+    """The optional LLM narrative only sees a row sample and the aggregates."""
+    columns, rows = state["columns"], state["rows"]
+    return f"""
+    You are a data analyst assistant. Describe what the SQL query results show in two or three sentences.
     ALWAYS BE STRICTLY ACCURATE OR ELSE I'LL THRASH YOU.
-    Format it neatly and clearly describe what was asked and what was found.
     Follow these rules:
-    1.Always show it as a table like it is viewed in a spreadsheet.
-    2. Start with a direct answer to the question
-    3. Present the data in a clean, organized format
-    
+    1. Start with a direct answer to the question
+    2. Only use numbers that appear in the summary, aggregates or sample rows below
+    3. Do not reproduce the table, it is shown to the user separately
 
     Question: {state['question']}
     SQL Query: {state.get('sql_query', '')}
-    SQL Results: {state['response']}
+    Summary: {summary}
+    Column aggregates over the fetched rows: {column_aggregates(columns, rows)}
+    Sample rows ({min(len(rows), ANSWER_NARRATIVE_SAMPLE_ROWS)} of {len(rows)}):
+{to_markdown_table(columns, rows, max_rows=ANSWER_NARRATIVE_SAMPLE_ROWS)}
 
-    Formatted Answer:
+    Answer:
     """
-    try:
-        formatted_answer = llm.invoke([HumanMessage(content=answer_prompt)]).content.strip()
-        return {**state, "response": formatted_answer}
-    except Exception as e:
-        return {**state, "response": f"Error formatting response: {str(e)}"}
+
+def _has_result(state: AgentState) -> bool:
+    # Errors and skipped executions already carry their message in "response"
+    return not state.get("execution_error") and state.get("rows") is not None
+
+def _summary(state: AgentState) -> str:
+    affected = state.get("affected_rows")
+    if affected is not None:
+        # INSERT/UPDATE/DELETE: the row count is the answer; rows only come from RETURNING
+        summary = f"The statement affected {affected} row{'s' if affected != 1 else ''}."
+        return f"{summary}\n\n{summarize_result(state['columns'], state['rows'])}" if state["rows"] else summary
+    return summarize_result(state["columns"], state["rows"], state.get("total_rows"), state.get("truncated", False))
+
+def _answer_state(state: AgentState, summary: str, narrative: str = None) -> AgentState:
+    columns, rows = state["columns"], state["rows"]
+    response = f"{summary}\n\n{to_markdown_table(columns, rows, max_rows=ANSWER_MAX_TABLE_ROWS)}".strip()
+    if narrative:
+        response = f"{narrative}\n\n{response}"
+    return {
+        **state,
+        "response": response,
+        "response_html": to_html_table(columns, rows, max_rows=ANSWER_MAX_TABLE_ROWS)
+    }
+
+def format_answer(state: AgentState) -> AgentState:
+    if not _has_result(state):
+        return state
+
+    summary = _summary(state)
+    narrative = None
+    if ANSWER_NARRATIVE_ENABLED and state["rows"]:
+        try:
+            message = get_llm(0.7).invoke([HumanMessage(content=_narrative_prompt(state, summary))])
+            narrative = message.content.strip()
+        except Exception as e:
+            print(f"Error generating answer narrative: {e}")
+    return _answer_state(state, summary, narrative)
+
+async def aformat_answer(state: AgentState) -> AgentState:
+    if not _has_result(state):
+        return state
+
+    summary = _summary(state)
+    narrative = None
+    if ANSWER_NARRATIVE_ENABLED and state["rows"]:
+        try:
+            message = await get_llm(0.7).ainvoke([HumanMessage(content=_narrative_prompt(state, summary))])
+            narrative = message.content.strip()
+        except Exception as e:
+            print(f"Error generating answer narrative: {e}")
+    return _answer_state(state, summary, narrative)
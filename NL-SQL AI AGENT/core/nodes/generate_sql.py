@@ -7,84 +7,23 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
 
-import os
+import asyncio
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import HumanMessage
-from langchain_core.runnables import RunnablePassthrough
-from utils.helpers import extract_sql_query
-# from core.nodes.embeddings1time import retriever2
+from utils.sql_validation import extract_sql_text, validate_sql
 # generate_sql.py
 from langchain_core.documents import Document
-from core.nodes.embeddings1time import get_retriever,db_supply
+from core.nodes.retrieve_schema import retrieve_schema, aretrieve_schema
+from utils.db import get_schema_cache
+from utils.llm import get_llm
+from utils.schema_compactor import compact_schema
+from utils.role_bundles import get_role_bundle
+from core.nodes.embeddings1time import get_embeddings
 from core.state import AgentState
-from config.settings import GROQ_API_KEY
-
-def generate_sql_query(state: AgentState) -> AgentState:
-    # print("Generating SQL query...")
-
-    if not state["allowed_tables"]:
-        print("No allowed tables. Skipping SQL generation.")
-        return state
-
-
-    llm = ChatGroq(
-        model_name="llama-3.3-70b-versatile",
-        temperature=0.7
-    )
-    
-
-    from langchain_openai import ChatOpenAI
-    from langchain_community.chat_models import ChatOpenAI
-
-    # Get retriever
-    retriever = get_retriever()
-    question = state["question"]
-    allowed_tables = state["allowed_tables"]
-
-    def get_relevant_schema(question: str, allowed_tables: list) -> str:
-        """Retrieve and combine schema information from both vector search and allowed tables"""
-        # 1. Get schema for all explicitly allowed tables first
-        allowed_schemas = []
-        for table in allowed_tables:
-            try:
-                table_info = db_supply.get_table_info([table])
-                allowed_schemas.append(
-                    Document(page_content=table_info, metadata={"table": table})
-                )
-                # print(f"Added schema for allowed table: {table}")
-            except Exception as e:
-                print(f"Could not get schema for allowed table {table}: {e}")
-
-        # 2. Get relevant docs from vector store
-        try:
-            retrieved_docs = retriever.invoke(question)
-            # print(f"Retrieved {len(retrieved_docs)} relevant schemas from vector store")
-        except Exception as e:
-            print(f"Vector retrieval failed: {e}")
-            retrieved_docs = []
-
-        # 3. Combine with priority to allowed tables
-        combined_docs = allowed_schemas + retrieved_docs
-        
-        # 4. Remove duplicates while preserving order
-        seen_tables = set()
-        unique_docs = []
-        for doc in combined_docs:
-            table = doc.metadata["table"]
-            if table not in seen_tables:
-                seen_tables.add(table)
-                unique_docs.append(doc)
-                # print(f"📄 Using schema for table: {table}")
-
-        return "\n\n".join([doc.page_content for doc in unique_docs])
+from config.settings import SUPPLY_DB_NAME, SCHEMA_COMPACTION_ENABLED, ROLE_BUNDLES_ENABLED
 
-    # Get combined schema
-    schema = get_relevant_schema(question, allowed_tables)
-
-    # Enhanced prompt template
-    template = """You are a PostgreSQL expert. Generate a SQL query following these rules:
+# Enhanced prompt template
+template = """You are a PostgreSQL expert. Generate a SQL query following these rules:
     1. Use ONLY these tables: {allowed_tables}
     2. Never use tables not listed above
     3. Use only columns that exist in the schema
@@ -97,37 +36,146 @@ def generate_sql_query(state: AgentState) -> AgentState:
 
     Write ONLY the SQL query, nothing else:
     """
-    prompt = ChatPromptTemplate.from_template(template)
+prompt = ChatPromptTemplate.from_template(template)
+
+# SQL generation chain, built once on the shared client
+sql_chain = (
+    prompt
+    | get_llm(0.7).bind(stop=["\nSQLResult:"])
+    | StrOutputParser()
+)
+
+def get_relevant_schema(question: str, allowed_tables: list, retrieved_schemas: dict,
+                        bundle: dict = None) -> str:
+    """Combine schema information from allowed tables and the vector search results"""
+    if SCHEMA_COMPACTION_ENABLED:
+        try:
+            # Allowed tables always go in; retrieved ones only while the budget allows
+            schema = compact_schema(SUPPLY_DB_NAME, question, allowed_tables, list(retrieved_schemas),
+                                    catalog=bundle["catalog"] if bundle else None)
+            if schema:
+                return schema
+        except Exception as e:
+            print(f"Schema compaction failed, using full table info: {e}")
 
-    # SQL generation chain
-    sql_chain = (
-        prompt
-        | llm.bind(stop=["\nSQLResult:"])
-        | StrOutputParser()
-    )
+    # 1. Get schema for all explicitly allowed tables first
+    allowed_schemas = []
+    for table in allowed_tables:
+        try:
+            if bundle and table in bundle["schemas"]:
+                table_info = bundle["schemas"][table]
+            else:
+                table_info = get_schema_cache(SUPPLY_DB_NAME).get_table_info(table)
+            allowed_schemas.append(
+                Document(page_content=table_info, metadata={"table": table})
+            )
+            # print(f"Added schema for allowed table: {table}")
+        except Exception as e:
+            print(f"Could not get schema for allowed table {table}: {e}")
+
+    # 2. Relevant docs from the vector store, retrieved in parallel with table extraction
+    retrieved_docs = [
+        Document(page_content=content, metadata={"table": table})
+        for table, content in retrieved_schemas.items()
+    ]
+
+    # 3. Combine with priority to allowed tables
+    combined_docs = allowed_schemas + retrieved_docs
+
+    # 4. Remove duplicates while preserving order
+    seen_tables = set()
+    unique_docs = []
+    for doc in combined_docs:
+        table = doc.metadata["table"]
+        if table not in seen_tables:
+            seen_tables.add(table)
+            unique_docs.append(doc)
+            # print(f"📄 Using schema for table: {table}")
+
+    return "\n\n".join([doc.page_content for doc in unique_docs])
+
+def _role_bundle(designation: str) -> dict:
+    if not ROLE_BUNDLES_ENABLED:
+        return None
+    try:
+        return get_role_bundle(designation, get_embeddings())
+    except Exception as e:
+        print(f"Role bundle unavailable for {designation}: {e}")
+        return None
+
+def _chain_input(state: AgentState, schema: str) -> dict:
+    return {
+        "question": state["question"],
+        "schema": schema,
+        "allowed_tables": state["allowed_tables"]  # Explicitly show allowed tables
+    }
+
+def _validated_result(state: AgentState, result: str) -> AgentState:
+    # print(f"LLM Output:\n{result}")
+    try:
+        sql_query = extract_sql_text(result)
+        if not sql_query:
+            raise ValueError("No SQL statement found in the model output")
+        # Parse-tree check: every referenced table must be allowed, and only
+        # roles with write access to all of them may run anything but SELECT
+        parsed = validate_sql(sql_query, state["allowed_tables"], state.get("writable_tables") or [])
+
+        # print(f"Valid SQL Query:\n{sql_query}")
+        return {
+            **state,
+            "sql_query": sql_query,
+            "sql_tables": parsed["tables"],
+            "sql_statement_type": parsed["statement_type"]
+        }
+    except Exception as e:
+        return _error_result(state, e)
+
+def _error_result(state: AgentState, error: Exception) -> AgentState:
+    print(f"SQL Generation Error: {error}")
+    return {
+        **state,
+        "sql_query": None,
+        "response": f"Error generating SQL: {str(error)}"
+    }
+
+def generate_sql_query(state: AgentState) -> AgentState:
+    # print("Generating SQL query...")
+
+    if not state["allowed_tables"]:
+        print("No allowed tables. Skipping SQL generation.")
+        return state
+
+    retrieved_schemas = state.get("retrieved_schemas")
+    if retrieved_schemas is None:
+        # Semantic cache hits skip retrieve_schema; fetch it now
+        retrieved_schemas = retrieve_schema(state)["retrieved_schemas"]
+
+    # Get combined schema
+    schema = get_relevant_schema(state["question"], state["allowed_tables"], retrieved_schemas,
+                                 _role_bundle(state["designation"]))
 
     try:
         # Invoke with enhanced context
-        result = sql_chain.invoke({
-            "question": question,
-            "schema": schema,
-            "allowed_tables": allowed_tables  # Explicitly show allowed tables
-        })
-        
-        # print(f"LLM Output:\n{result}")
-
-        # Validate SQL before returning
-        sql_query = extract_sql_query(result)
-        if not any(table.lower() in sql_query.lower() for table in allowed_tables):
-            raise ValueError(f"Generated SQL doesn't use allowed tables: {sql_query}")
+        result = sql_chain.invoke(_chain_input(state, schema))
+    except Exception as e:
+        return _error_result(state, e)
+    return _validated_result(state, result)
 
-        # print(f"Valid SQL Query:\n{sql_query}")
-        return {**state, "sql_query": sql_query}
+async def agenerate_sql_query(state: AgentState) -> AgentState:
+    if not state["allowed_tables"]:
+        print("No allowed tables. Skipping SQL generation.")
+        return state
+
+    retrieved_schemas = state.get("retrieved_schemas")
+    if retrieved_schemas is None:
+        retrieved_schemas = (await aretrieve_schema(state))["retrieved_schemas"]
+
+    # Catalog reads are synchronous; keep them off the event loop
+    bundle = await asyncio.to_thread(_role_bundle, state["designation"])
+    schema = await asyncio.to_thread(get_relevant_schema, state["question"], state["allowed_tables"], retrieved_schemas, bundle)
 
+    try:
+        result = await sql_chain.ainvoke(_chain_input(state, schema))
     except Exception as e:
-        print(f"SQL Generation Error: {e}")
-        return {
-            **state, 
-            "sql_query": None, 
-            "response": f"Error generating SQL: {str(e)}"
-        }
\ No newline at end of file
+        return _error_result(state, e)
+    return _validated_result(state, result)
@@ -0,0 +1,192 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+import json
+from sqlalchemy import text
+from sqlglot import exp
+from core.state import AgentState
+from utils.db import get_engine, get_async_engine
+from utils.sql_validation import parse_sql, validate_sql, SQLValidationError
+from utils.instrumentation import timed
+from config.settings import SUPPLY_DB_NAME, SQL_COST_BUDGETS
+
+def get_sql_budget(designation: str) -> dict:
+    return {**SQL_COST_BUDGETS["default"], **SQL_COST_BUDGETS.get(designation, {})}
+
+# Transaction-local, so pooled connections keep their default afterwards
+STATEMENT_TIMEOUT_QUERY = text("SELECT set_config('statement_timeout', :ms, true)")
+
+def set_statement_timeout(conn, timeout_ms):
+    conn.execute(STATEMENT_TIMEOUT_QUERY, {"ms": str(int(timeout_ms))})
+
+async def aset_statement_timeout(conn, timeout_ms):
+    await conn.execute(STATEMENT_TIMEOUT_QUERY, {"ms": str(int(timeout_ms))})
+
+READ_ONLY_QUERY = text("SET TRANSACTION READ ONLY")
+
+def _explain_query(sql_query: str):
+    # parse_sql raises on anything but exactly one statement, so a trailing
+    # "; DELETE ..." can never reach the EXPLAIN text
+    parse_sql(sql_query)
+    return text(f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}")
+
+def _top_plan(plan) -> dict:
+    # psycopg2 decodes the json column, asyncpg hands it over as text
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+def explain(sql_query: str, timeout_ms) -> dict:
+    """Return the top plan node of EXPLAIN (FORMAT JSON) without running the query.
+
+    Runs in a read-only transaction that is always rolled back.
+    """
+    query = _explain_query(sql_query)
+    with timed("db", "explain"), get_engine(SUPPLY_DB_NAME).connect() as conn:
+        try:
+            conn.execute(READ_ONLY_QUERY)
+            set_statement_timeout(conn, timeout_ms)
+            plan = conn.execute(query).scalar()
+        finally:
+            conn.rollback()
+    return _top_plan(plan)
+
+async def aexplain(sql_query: str, timeout_ms) -> dict:
+    query = _explain_query(sql_query)
+    with timed("db", "explain"):
+        async with get_async_engine(SUPPLY_DB_NAME).connect() as conn:
+            try:
+                await conn.execute(READ_ONLY_QUERY)
+                await aset_statement_timeout(conn, timeout_ms)
+                plan = (await conn.execute(query)).scalar()
+            finally:
+                await conn.rollback()
+    return _top_plan(plan)
+
+def _seq_scans(plan: dict) -> list:
+    scans = [plan["Relation Name"]] if plan.get("Node Type") == "Seq Scan" and "Relation Name" in plan else []
+    for child in plan.get("Plans", []):
+        scans.extend(_seq_scans(child))
+    return scans
+
+def is_select(sql_query: str) -> bool:
+    try:
+        return parse_sql(sql_query)["statement_type"] == "SELECT"
+    except SQLValidationError:
+        return sql_query.lstrip().lower().startswith(("select", "with"))
+
+def _explain_failed(state: AgentState, error: Exception) -> AgentState:
+    if isinstance(error, SQLValidationError):
+        # Never fall through to execution with SQL that could not be explained safely
+        return {**state, "sql_query": None, "response": f"Query rejected: {error}"}
+    # Let run_sql_query report the real error; its statement_timeout still applies
+    print(f"EXPLAIN failed, skipping cost guard: {error}")
+    return {**state, "query_plan": {"action": "unchecked", "error": str(error)}}
+
+def _no_sql_result(state: AgentState) -> AgentState:
+    # Nothing to run: keep the generation error if there is one. The graph
+    # ends after this node, so the fallback answer has to be set here.
+    print("No SQL query found. Skipping execution.")
+    return {
+        **state,
+        "response": state.get("response") or "No valid SQL query was generated."
+    }
+
+def _validate(state: AgentState) -> AgentState:
+    """Parse-tree check of the SQL about to be costed; None if it passes.
+
+    generate_sql validates what it produces, but semantic cache hits arrive
+    here straight from the cache, so the check is repeated (the parse is cached).
+    """
+    try:
+        validate_sql(state["sql_query"], state["allowed_tables"], state.get("writable_tables") or [])
+    except SQLValidationError as e:
+        print(f"SQL rejected before EXPLAIN: {e}")
+        return {**state, "sql_query": None, "response": f"Query rejected: {e}"}
+    return None
+
+def _row_limit(ast):
+    """The LIMIT (or FETCH FIRST) count expression of a query, if any."""
+    limit = ast.args.get("limit")
+    if isinstance(limit, exp.Fetch):
+        return limit.args.get("count")
+    return limit.expression if limit is not None else None
+
+def _limited_sql(sql_query: str, max_rows: int) -> str:
+    """`sql_query` returning at most `max_rows` rows, or None if it already does.
+
+    The limit is set on the parse tree, so ORDER BY, OFFSET and a trailing
+    `;` stay valid and a smaller existing LIMIT wins.
+    """
+    ast = parse_sql(sql_query)["ast"]
+    current = _row_limit(ast)
+    if isinstance(current, exp.Literal) and current.is_int:
+        if int(current.this) <= max_rows:
+            return None
+        current = None
+    elif isinstance(current, exp.Var):
+        # LIMIT ALL
+        current = None
+    cap = exp.Literal.number(max_rows)
+    if current is not None:
+        cap = exp.func("LEAST", current.copy(), cap)
+    return ast.copy().limit(cap).sql(dialect="postgres")
+
+def _apply_budget(state: AgentState, plan: dict, budget: dict) -> AgentState:
+    sql_query = state["sql_query"]
+    summary = {
+        "node_type": plan.get("Node Type"),
+        "total_cost": plan.get("Total Cost"),
+        "plan_rows": plan.get("Plan Rows"),
+        "seq_scans": _seq_scans(plan),
+        "budget": budget,
+        "action": "allowed",
+    }
+
+    if summary["total_cost"] > budget["max_cost"]:
+        summary["action"] = "rejected"
+        return {
+            **state,
+            "sql_query": None,
+            "query_plan": summary,
+            "response": (
+                f"Query rejected: estimated cost {summary['total_cost']:.0f} exceeds the "
+                f"{budget['max_cost']} budget for '{state['designation']}'. Try a narrower question."
+            )
+        }
+
+    if summary["plan_rows"] > budget["max_rows"] and is_select(sql_query):
+        limited = _limited_sql(sql_query, int(budget["max_rows"]))
+        if limited is not None:
+            summary["action"] = "limited"
+            sql_query = limited
+
+    return {**state, "sql_query": sql_query, "query_plan": summary}
+
+def guard_sql_cost(state: AgentState) -> AgentState:
+    if not state.get("sql_query"):
+        return _no_sql_result(state)
+    rejected = _validate(state)
+    if rejected is not None:
+        return rejected
+
+    budget = get_sql_budget(state["designation"])
+    try:
+        plan = explain(state["sql_query"], budget["statement_timeout_ms"])
+    except Exception as e:
+        return _explain_failed(state, e)
+    return _apply_budget(state, plan, budget)
+
+async def aguard_sql_cost(state: AgentState) -> AgentState:
+    if not state.get("sql_query"):
+        return _no_sql_result(state)
+    rejected = _validate(state)
+    if rejected is not None:
+        return rejected
+
+    budget = get_sql_budget(state["designation"])
+    try:
+        plan = await aexplain(state["sql_query"], budget["statement_timeout_ms"])
+    except Exception as e:
+        return _explain_failed(state, e)
+    return _apply_budget(state, plan, budget)
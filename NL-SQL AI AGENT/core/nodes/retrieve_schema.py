@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+import asyncio
+from core.state import AgentState
+from core.nodes.embeddings1time import get_retriever, get_embeddings
+from core.nodes.semantic_cache import embed_question, aembed_question
+from utils.role_bundles import get_role_bundle, search_role_bundle
+from utils.instrumentation import timed
+from config.settings import ROLE_BUNDLES_ENABLED, SCHEMA_RETRIEVER_K, VECTOR_BACKEND
+
+def _schemas_from_docs(retrieved_docs) -> AgentState:
+    # Parallel branches may not write the same state keys, so return only ours
+    return {
+        "retrieved_schemas": {doc.metadata["table"]: doc.page_content for doc in retrieved_docs}
+    }
+
+def _search_bundle(designation: str, vector) -> AgentState:
+    """Search only the designation's readable tables, in process; None falls back to the retriever."""
+    try:
+        bundle = get_role_bundle(designation, get_embeddings())
+    except Exception as e:
+        print(f"Role bundle unavailable for {designation}: {e}")
+        return None
+    if not bundle or not bundle["vectors"]:
+        return None
+    with timed("retriever", "role_bundle"):
+        return {"retrieved_schemas": search_role_bundle(bundle, vector, SCHEMA_RETRIEVER_K)}
+
+def retrieve_schema(state: AgentState) -> AgentState:
+    """Vector search for table schemas relevant to the question.
+
+    Depends only on the question, so the graph runs it in parallel with
+    extract_table_and_operation.
+    """
+    if ROLE_BUNDLES_ENABLED:
+        try:
+            result = _search_bundle(state["designation"], embed_question(state["question"]))
+            if result is not None:
+                return result
+        except Exception as e:
+            print(f"Bundle schema search failed: {e}")
+
+    try:
+        retriever = get_retriever()
+        with timed("retriever", VECTOR_BACKEND) as call:
+            retrieved_docs = retriever.invoke(state["question"])
+            call["docs"] = len(retrieved_docs)
+        # print(f"Retrieved {len(retrieved_docs)} relevant schemas from vector store")
+    except Exception as e:
+        print(f"Vector retrieval failed: {e}")
+        retrieved_docs = []
+    return _schemas_from_docs(retrieved_docs)
+
+async def aretrieve_schema(state: AgentState) -> AgentState:
+    if ROLE_BUNDLES_ENABLED:
+        try:
+            vector = await aembed_question(state["question"])
+            result = await asyncio.to_thread(_search_bundle, state["designation"], vector)
+            if result is not None:
+                return result
+        except Exception as e:
+            print(f"Bundle schema search failed: {e}")
+
+    try:
+        # The first call may build the collection; keep that off the event loop
+        retriever = await asyncio.to_thread(get_retriever)
+        with timed("retriever", VECTOR_BACKEND) as call:
+            retrieved_docs = await retriever.ainvoke(state["question"])
+            call["docs"] = len(retrieved_docs)
+    except Exception as e:
+        print(f"Vector retrieval failed: {e}")
+        retrieved_docs = []
+    return _schemas_from_docs(retrieved_docs)
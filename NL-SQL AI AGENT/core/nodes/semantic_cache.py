@@ -0,0 +1,119 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+from core.state import AgentState
+from core.nodes.embeddings1time import get_embeddings
+from utils.cache import SemanticCache, TTLCache
+from utils.helpers import question_literals
+from utils.instrumentation import timed, record
+from core.nodes.guard_sql import is_select
+from config.settings import SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE
+
+# Scoped by designation; a hit is only used if check_user_permissions still
+# grants exactly the tables the cached SQL was generated for (decide_next_step).
+# Embeddings barely separate "orders for customer 12" from "... customer 13",
+# so a hit also needs the same literals (question_literals) as the cached question.
+semantic_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, maxsize=SEMANTIC_CACHE_SIZE)
+# Lookup, the table resolver and update run in the same request; embed each
+# question only once.
+_question_vectors = TTLCache(maxsize=256, ttl=600)
+
+def embed_question(question: str):
+    vector = _question_vectors.get(question)
+    if vector is None:
+        with timed("embedding", "embed_question"):
+            vector = get_embeddings().embed_query(question)
+        _question_vectors.set(question, vector)
+    return vector
+
+async def aembed_question(question: str):
+    vector = _question_vectors.get(question)
+    if vector is None:
+        with timed("embedding", "embed_question"):
+            vector = await get_embeddings().aembed_query(question)
+        _question_vectors.set(question, vector)
+    return vector
+
+def _lookup(state: AgentState, vector) -> AgentState:
+    literals = question_literals(state["question"])
+    cached = semantic_cache.lookup(
+        state["designation"], vector, match=lambda value: value["literals"] == literals
+    )
+    record("cache", "semantic_cache", cache_hit=cached is not None)
+    if cached is None:
+        return {**state, "cache_hit": False}
+
+    return {
+        **state,
+        "cache_hit": True,
+        "tables_requested": cached["tables_requested"],
+        "crud_operation": cached["crud_operation"],
+        "cached_allowed_tables": cached["allowed_tables"],
+        "sql_query": cached["sql_query"]
+    }
+
+def _should_store(state: AgentState) -> bool:
+    # Only SELECTs that actually executed are worth reusing; a cached write
+    # would run again for every similar question
+    return SEMANTIC_CACHE_ENABLED and bool(state.get("sql_query")) and not state.get("execution_error") \
+        and is_select(state["sql_query"])
+
+def _store(state: AgentState, vector):
+    semantic_cache.add(
+        state["designation"],
+        state["question"].strip().lower(),
+        vector,
+        {
+            "tables_requested": state["tables_requested"],
+            "crud_operation": state["crud_operation"],
+            "allowed_tables": state["allowed_tables"],
+            "sql_query": state["sql_query"],
+            "literals": question_literals(state["question"])
+        }
+    )
+
+def lookup_semantic_cache(state: AgentState) -> AgentState:
+    if not SEMANTIC_CACHE_ENABLED:
+        return {**state, "cache_hit": False}
+
+    try:
+        vector = embed_question(state["question"])
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return {**state, "cache_hit": False}
+    return _lookup(state, vector)
+
+async def alookup_semantic_cache(state: AgentState) -> AgentState:
+    if not SEMANTIC_CACHE_ENABLED:
+        return {**state, "cache_hit": False}
+
+    try:
+        vector = await aembed_question(state["question"])
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return {**state, "cache_hit": False}
+    return _lookup(state, vector)
+
+def update_semantic_cache(state: AgentState) -> AgentState:
+    if not _should_store(state):
+        return state
+
+    try:
+        vector = embed_question(state["question"])
+    except Exception as e:
+        print(f"Semantic cache update failed: {e}")
+        return state
+    _store(state, vector)
+    return state
+
+async def aupdate_semantic_cache(state: AgentState) -> AgentState:
+    if not _should_store(state):
+        return state
+
+    try:
+        vector = await aembed_question(state["question"])
+    except Exception as e:
+        print(f"Semantic cache update failed: {e}")
+        return state
+    _store(state, vector)
+    return state
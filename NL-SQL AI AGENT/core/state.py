@@ -1,5 +1,6 @@
 # core/state.py
-from typing import TypedDict, List, Dict, Any, Optional
+import operator
+from typing import TypedDict, List, Dict, Any, Optional, Annotated
 
 class AgentState(TypedDict):
     question: str
@@ -9,6 +10,24 @@ class AgentState(TypedDict):
     crud_operation: str
     allowed_tables: List[str]
     forbidden_tables: List[str]
+    writable_tables: List[str]
+    retrieved_schemas: Dict[str, str]
     permission_status: str
     sql_query: Optional[str]
-    response: Optional[str]
\ No newline at end of file
+    sql_tables: List[str]
+    sql_statement_type: Optional[str]
+    query_plan: Optional[Dict[str, Any]]
+    columns: List[str]
+    rows: List[List[Any]]
+    row_count: int
+    truncated: bool
+    total_rows: Optional[int]
+    affected_rows: Optional[int]
+    response: Optional[str]
+    response_html: Optional[str]
+    execution_error: Optional[str]
+    cache_hit: bool
+    cached_allowed_tables: List[str]
+    result_cache_hit: bool
+    # Timing/token events, appended by every node (utils/instrumentation.py)
+    metrics: Annotated[List[Dict[str, Any]], operator.add]
@@ -0,0 +1,153 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+
+import argparse
+import asyncio
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.nodes.embeddings1time import get_retriever
+from core.nodes.extract_table import schema_index
+from config.settings import AGENT_SERVER_HOST, AGENT_SERVER_PORT
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+except ImportError:
+    generate_latest = None
+from run_agent import run_question, astream_question, to_json
+
+# Streaming requests all run on one long-lived event loop: the async DB
+# engines are bound to the loop that created them.
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, daemon=True).start()
+
+
+def warm_up():
+    # Importing run_agent already compiled the graph and built the LLM clients;
+    # load the retriever and the table resolver too so the first question
+    # doesn't pay for them.
+    try:
+        get_retriever()
+    except Exception as e:
+        print(f"Retriever warm-up failed: {e}")
+    try:
+        schema_index().refresh()
+    except Exception as e:
+        print(f"Table resolver warm-up failed: {e}")
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    """Serves the run_agent.py JSON contract over HTTP.
+
+    POST /query with {"question", "user_email", "designation"} returns the same
+    JSON object run_agent.py prints to stdout. POST /query/stream returns the
+    newline-delimited JSON events (progress, rows, tokens, result) of
+    `run_agent.py --stream`. GET /metrics serves Prometheus metrics when
+    prometheus_client is installed.
+    """
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "OK"})
+        elif self.path == "/metrics" and generate_latest is not None:
+            # Node, call, token and cache metrics recorded by utils/instrumentation.py
+            data = generate_latest()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE_LATEST)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"success": False, "error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ("/query", "/query/stream"):
+            self._send_json(404, {"success": False, "error": f"Unknown path: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"success": False, "error": f"Invalid request body: {e}"})
+            return
+
+        if self.path == "/query/stream":
+            self._stream(payload)
+            return
+
+        output = run_question(
+            payload.get("question"),
+            payload.get("user_email"),
+            payload.get("designation")
+        )
+        self._send_json(200, output)
+
+    def _stream(self, payload):
+        # No Content-Length: the body ends when the connection closes (HTTP/1.0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        self.wfile.flush()
+
+        # The event loop only queues lines; this handler thread does the socket
+        # writes so one slow client can't stall the other streams.
+        lines = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            astream_question(
+                payload.get("question"),
+                payload.get("user_email"),
+                payload.get("designation"),
+                lines.put
+            ),
+            _loop
+        )
+        future.add_done_callback(lambda _: lines.put(None))
+
+        while True:
+            line = lines.get()
+            if line is None:
+                break
+            try:
+                self.wfile.write(line.encode("utf-8") + b"\n")
+                self.wfile.flush()
+            except OSError:
+                # Client went away; stop the run instead of finishing it unread
+                future.cancel()
+                break
+
+    def _send_json(self, status, body):
+        data = to_json(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Requests are already logged by the Node server.
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived NL-SQL agent worker")
+    parser.add_argument("--host", default=AGENT_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=AGENT_SERVER_PORT)
+    args = parser.parse_args()
+
+    warm_up()
+    server = ThreadingHTTPServer((args.host, args.port), AgentRequestHandler)
+    server.daemon_threads = True
+    print(f"Agent worker listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+
+import argparse
+import time
+
+from core.nodes.embeddings1time import get_embeddings
+from utils.role_bundles import build_all_role_bundles, build_role_bundle, save_role_bundle
+
+# Precomputes the per-designation bundles (utils/role_bundles.py) so agent
+# workers start with them on disk. Run after deployments or schema changes;
+# workers rebuild a stale bundle in the background and use the plain
+# permission query until it is ready.
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-designation role bundles")
+    parser.add_argument("designations", nargs="*", help="only these role_names (default: every role)")
+    parser.add_argument("--no-embeddings", action="store_true", help="skip table embeddings")
+    args = parser.parse_args()
+
+    embeddings = None if args.no_embeddings else get_embeddings()
+    started = time.perf_counter()
+    if args.designations:
+        for designation in args.designations:
+            save_role_bundle(build_role_bundle(designation, embeddings))
+        roles = args.designations
+    else:
+        roles = build_all_role_bundles(embeddings)
+    print(f"Built {len(roles)} role bundles in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,26 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
 
 from core.agentgraph import app
+from utils.db import dispose_async_engines
+import asyncio
 import json
-def main():
-    if len(sys.argv) < 4:
-        print(json.dumps({
+
+def to_json(obj):
+    # Query results can hold Decimal/date values
+    return json.dumps(obj, default=str)
+
+def run_question(question, user_email, designation, on_rows=None):
+    """Run one question through the compiled graph and build the JSON response.
+
+    Shared by the CLI below and the long-lived agent_server workers so both
+    return exactly the same contract to the Node server. `on_rows(columns, rows)`
+    is called with each chunk of result rows as it is fetched.
+    """
+    if not question or not user_email or not designation:
+        return {
             "success": False,
             "error": "Missing arguments: question, user_email, designation"
-        }))
-        return
-
-    question = sys.argv[1]
-    user_email = sys.argv[2]
-    designation = sys.argv[3]
+        }
 
     input_data = {
         "question": question,
@@ -23,7 +31,7 @@ def main():
     }
 
     try:
-        result = app.invoke(input_data)
+        result = app.invoke(input_data, config={"configurable": {"on_rows": on_rows}})
         # Return only what’s needed
         output = {
             "success": True,
@@ -35,8 +43,121 @@ def main():
             "error": str(e),
             "input_data": input_data
         }
+    return output
+
+def _progress_event(node, output):
+    """Compact progress event for a finished graph node, or None to skip it."""
+    if node == "lookup_semantic_cache":
+        return {"cache_hit": output.get("cache_hit", False)}
+    if node == "extract_table_and_operation":
+        return {"tables": output.get("tables_requested"), "operation": output.get("crud_operation")}
+    if node == "check_user_permissions":
+        return {
+            "permission_status": output.get("permission_status"),
+            "allowed_tables": output.get("allowed_tables"),
+            "forbidden_tables": output.get("forbidden_tables")
+        }
+    if node in ("generate_sql_for_allowed", "guard_sql_cost"):
+        return {"sql_query": output.get("sql_query")}
+    if node == "run_sql_query":
+        return {
+            "row_count": output.get("row_count"),
+            "truncated": output.get("truncated", False),
+            "error": output.get("execution_error")
+        }
+    return None
+
+def _is_node_run(event, node) -> bool:
+    # The instrumented RunnableLambda inside each node carries the node's name
+    # too; only the node run itself is tagged with its graph step
+    return node == event["name"] and f"graph:step:{event['metadata'].get('langgraph_step')}" in event.get("tags", [])
+
+async def astream_question(question, user_email, designation, write_line):
+    """Newline-delimited JSON variant of run_question.
+
+    Emits, as they happen:
+      {"type": "progress", "node": ...}  when a graph node finishes
+      {"type": "rows", ...}              for each chunk of result rows
+      {"type": "token", "content": ...}  for the answer text
+    then one {"type": "result", ...} event with the usual contract. Rows
+    already sent are left out of the final result.
+
+    Tokens come from the format_answer LLM when ANSWER_NARRATIVE_ENABLED is
+    on; otherwise the locally rendered answer is sent as a single token so
+    clients always get the answer through "token" events.
+    """
+    if not question or not user_email or not designation:
+        write_line(to_json({"type": "result", **run_question(question, user_email, designation)}))
+        return
+
+    input_data = {
+        "question": question,
+        "user_email": user_email,
+        "designation": designation
+    }
+
+    def on_rows(columns, rows):
+        write_line(to_json({"type": "rows", "columns": columns, "rows": rows}))
+
+    result = None
+    sent_tokens = False
+    try:
+        async for event in app.astream_events(
+            input_data,
+            config={"configurable": {"on_rows": on_rows}},
+            version="v2"
+        ):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind == "on_chat_model_stream" and node == "format_answer":
+                content = event["data"]["chunk"].content
+                if content:
+                    sent_tokens = True
+                    write_line(to_json({"type": "token", "content": content}))
+            elif kind == "on_chain_end" and _is_node_run(event, node):
+                output = event["data"].get("output")
+                progress = _progress_event(node, output) if isinstance(output, dict) else None
+                if progress is not None:
+                    write_line(to_json({"type": "progress", "node": node, **progress}))
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                # The root run's output is the final graph state
+                result = event["data"].get("output")
+        if not sent_tokens and result and result.get("response"):
+            write_line(to_json({"type": "token", "content": result["response"]}))
+        output = {
+            "success": True,
+            "result": {k: v for k, v in (result or {}).items() if k != "rows"}
+        }
+    except Exception as e:
+        output = {
+            "success": False,
+            "error": str(e),
+            "input_data": input_data
+        }
+    write_line(to_json({"type": "result", **output}))
+
+async def _stream_cli(question, user_email, designation):
+    try:
+        await astream_question(question, user_email, designation, lambda line: print(line, flush=True))
+    finally:
+        # The async engines belong to this asyncio.run loop
+        await dispose_async_engines()
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--stream"]
+    if len(args) < 3:
+        print(json.dumps({
+            "success": False,
+            "error": "Missing arguments: question, user_email, designation"
+        }))
+        return
+
+    if "--stream" in sys.argv:
+        asyncio.run(_stream_cli(args[0], args[1], args[2]))
+        return
 
-    print(json.dumps(output))
+    output = run_question(args[0], args[1], args[2])
+    print(to_json(output))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,142 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..','..')))
+
+import argparse
+import asyncio
+import contextlib
+import json
+import time
+
+from core.agentgraph import app
+from core.nodes.embeddings1time import get_retriever
+from core.nodes.extract_table import schema_index
+from utils.db import dispose_async_engines
+from config.settings import BATCH_CONCURRENCY
+from run_agent import to_json
+
+# Runs a pack of questions through the compiled graph in one process.
+# Input is JSONL, one {"question", "user_email", "designation"} object per line
+# (an optional "id" is echoed back). Output is JSONL in completion order, one
+# line per question, flushed as soon as each question finishes.
+
+
+def read_questions(path):
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    questions = []
+    with source:
+        for line_no, line in enumerate(source, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                print(f"Skipping input line {line_no}: {e}", file=sys.stderr)
+                continue
+            item.setdefault("id", line_no)
+            questions.append(item)
+    return questions
+
+
+def completed_ids(path):
+    """ids already written to an earlier (possibly interrupted) output file."""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                # A crash can leave a half-written last line
+                continue
+    return done
+
+
+async def run_one(item, semaphore):
+    input_data = {
+        "question": item.get("question"),
+        "user_email": item.get("user_email"),
+        "designation": item.get("designation")
+    }
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            if not all(input_data.values()):
+                raise ValueError("Missing fields: question, user_email, designation")
+            result = await app.ainvoke(input_data)
+            output = {"success": True, "result": result}
+        except Exception as e:
+            output = {"success": False, "error": str(e), "input_data": input_data}
+        output["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return {"id": item["id"], **output}
+
+
+async def run_batch(questions, out, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(run_one(item, semaphore)) for item in questions]
+    failed = 0
+    try:
+        for finished, task in enumerate(asyncio.as_completed(tasks), 1):
+            output = await task
+            failed += not output["success"]
+            out.write(to_json(output) + "\n")
+            out.flush()
+            print(
+                f"[{finished}/{len(tasks)}] id={output['id']} "
+                f"{'ok' if output['success'] else 'failed'} in {output['elapsed_s']}s",
+                file=sys.stderr
+            )
+    finally:
+        # The async engines belong to this asyncio.run loop
+        await dispose_async_engines()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL pack of questions through the NL-SQL agent")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL questions file, or - for stdin")
+    parser.add_argument("-o", "--output", help="JSONL results file (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--resume", action="store_true",
+                        help="skip ids already present in --output and append to it")
+    args = parser.parse_args()
+
+    questions = read_questions(args.input)
+    if args.resume:
+        if not args.output:
+            parser.error("--resume needs --output")
+        done = completed_ids(args.output)
+        questions = [item for item in questions if item["id"] not in done]
+        print(f"Resuming: {len(done)} already done, {len(questions)} left", file=sys.stderr)
+
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        # The nodes print progress and debug lines; send them to stderr so
+        # stdout carries nothing but the JSONL results
+        with contextlib.redirect_stdout(sys.stderr):
+            # Shared setup: the graph and LLM clients are built on import; load the
+            # retriever and table resolver once here instead of inside the first few questions.
+            try:
+                get_retriever()
+                schema_index().refresh()
+            except Exception as e:
+                print(f"Warm-up failed: {e}", file=sys.stderr)
+
+            started = time.perf_counter()
+            failed = asyncio.run(run_batch(questions, out, max(1, args.concurrency)))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    rate = len(questions) / elapsed if elapsed else 0.0
+    print(
+        f"{len(questions)} questions ({failed} failed) in {elapsed:.1f}s, "
+        f"{rate:.2f} questions/s at concurrency {args.concurrency}",
+        file=sys.stderr
+    )
+
+if __name__ == "__main__":
+    main()
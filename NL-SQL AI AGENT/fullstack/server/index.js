@@ -4,8 +4,7 @@ import bcrypt from 'bcryptjs';
 import jwt from 'jsonwebtoken';
 import pkg from 'pg';
 import dotenv from 'dotenv';
-import { exec } from 'child_process';
-import util from 'util';
+import { spawn } from 'child_process';
 import path from 'path';
 import { fileURLToPath } from 'url';
 
@@ -15,10 +14,116 @@ const __dirname = path.dirname(__filename);
 dotenv.config();
 
 const { Pool } = pkg;
-const execAsync = util.promisify(exec);
 const app = express();
 const PORT = process.env.PORT || 5000;
 
+// Pool of long-lived Python agent workers (4i_aiagent/agent_server.py).
+// Each worker imports the graph, LLM clients and retriever once at startup,
+// so /api/query no longer pays the cold start on every question.
+const PYTHON_BIN = process.env.PYTHON_BIN || 'python';
+const AGENT_WORKERS = parseInt(process.env.AGENT_WORKERS || '2');
+const AGENT_BASE_PORT = parseInt(process.env.AGENT_BASE_PORT || '8765');
+// How long a request waits for a worker to come up (startup, restarts)
+const AGENT_READY_TIMEOUT_MS = parseInt(process.env.AGENT_READY_TIMEOUT_MS || '30000');
+const agentServerPath = path.join(__dirname, '../4i_aiagent/agent_server.py');
+const agentWorkers = [];
+let nextAgentWorker = 0;
+let shuttingDown = false;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// A worker only joins the rotation once it answers /health; until then it is
+// still importing the graph or restarting.
+async function waitUntilHealthy(worker, child) {
+  while (!shuttingDown && worker.process === child && child.exitCode === null) {
+    try {
+      const response = await fetch(`http://127.0.0.1:${worker.port}/health`, {
+        signal: AbortSignal.timeout(1000)
+      });
+      if (response.ok) {
+        worker.ready = true;
+        return;
+      }
+    } catch (error) {
+      // Not listening yet
+    }
+    await sleep(500);
+  }
+}
+
+function markUnready(worker) {
+  if (!worker.ready) return;
+  worker.ready = false;
+  waitUntilHealthy(worker, worker.process);
+}
+
+function startAgentWorker(port) {
+  const worker = { port, process: null, ready: false };
+  const launch = () => {
+    worker.ready = false;
+    const child = spawn(PYTHON_BIN, [agentServerPath, '--port', String(port)], {
+      stdio: ['ignore', 'inherit', 'inherit']
+    });
+    worker.process = child;
+    child.on('exit', (code) => {
+      worker.ready = false;
+      if (shuttingDown) return;
+      console.error(`Agent worker on port ${port} exited with code ${code}, restarting`);
+      setTimeout(launch, 1000);
+    });
+    waitUntilHealthy(worker, child);
+  };
+  launch();
+  return worker;
+}
+
+for (let i = 0; i < AGENT_WORKERS; i++) {
+  agentWorkers.push(startAgentWorker(AGENT_BASE_PORT + i));
+}
+
+function stopAgentWorkers() {
+  shuttingDown = true;
+  agentWorkers.forEach((worker) => worker.process && worker.process.kill());
+}
+process.on('exit', stopAgentWorkers);
+process.on('SIGINT', () => process.exit(0));
+process.on('SIGTERM', () => process.exit(0));
+
+async function agentRequest(agentPath, payload) {
+  const deadline = Date.now() + AGENT_READY_TIMEOUT_MS;
+  for (;;) {
+    // Round-robin across ready workers; each worker also serves requests concurrently.
+    for (let tried = 0; tried < agentWorkers.length; tried++) {
+      const worker = agentWorkers[nextAgentWorker];
+      nextAgentWorker = (nextAgentWorker + 1) % agentWorkers.length;
+      if (!worker.ready) continue;
+
+      try {
+        return await fetch(`http://127.0.0.1:${worker.port}${agentPath}`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify(payload)
+        });
+      } catch (error) {
+        // A refused connection never reached the worker, so the next one can
+        // safely take the request; anything else may have run it already.
+        if (error.cause?.code !== 'ECONNREFUSED') throw error;
+        console.error(`Agent worker on port ${worker.port} refused the connection, trying the next one`);
+        markUnready(worker);
+      }
+    }
+    if (Date.now() >= deadline) {
+      throw new Error('No agent worker is ready');
+    }
+    await sleep(200);
+  }
+}
+
+async function queryAgent(payload) {
+  const response = await agentRequest('/query', payload);
+  return response.json();
+}
+
 // Middleware
 app.use(cors());
 app.use(express.json());
@@ -202,6 +307,19 @@ app.get('/api/auth/profile', authenticateToken, async (req, res) => {
   }
 });
 
+async function getAgentUser(userId) {
+  const client = await pool.connect();
+  try {
+    const userResult = await client.query(
+      'SELECT employee_email, designation FROM "4iempdet" WHERE id = $1',
+      [userId]
+    );
+    return userResult.rows[0];
+  } finally {
+    client.release();
+  }
+}
+
 app.post('/api/query', authenticateToken, async (req, res) => {
   try {
     const { question } = req.body;
@@ -211,13 +329,7 @@ app.post('/api/query', authenticateToken, async (req, res) => {
     }
 
     // Get user details from database
-    const client = await pool.connect();
-    const userResult = await client.query(
-      'SELECT employee_email, designation FROM "4iempdet" WHERE id = $1',
-      [req.user.userId]
-    );
-    const userData = userResult.rows[0];
-    client.release();
+    const userData = await getAgentUser(req.user.userId);
 
     if (!userData || !userData.designation) {
       return res.status(404).json({
@@ -234,45 +346,86 @@ app.post('/api/query', authenticateToken, async (req, res) => {
       designation
     });
 
-    // Run the Python script
-    const pythonScriptPath = path.join(__dirname, '../4i_aiagent/run_agent.py');
+    const pythonResult = await queryAgent({ question, user_email, designation });
 
-    const pythonCommand = `python "${pythonScriptPath}" "${question}" "${user_email}" "${designation}"`;
+    res.json(pythonResult);
 
-    console.log("Final Python Command:", pythonCommand);
+  } catch (error) {
+    console.error('Query processing failed:', error.message);
+    res.status(500).json({
+      error: "Query processing failed",
+      details: error.message
+    });
+  }
+});
 
-    const { stdout, stderr } = await execAsync(pythonCommand);
+// Streaming variant of /api/query: newline-delimited JSON events ("progress"
+// per agent step, "rows" chunks, "token"s of the answer, then one "result").
+// Without ANSWER_NARRATIVE_ENABLED the whole answer arrives as one "token".
+// Clients sending `Accept: text/event-stream` get the same events as SSE.
+app.post('/api/query/stream', authenticateToken, async (req, res) => {
+  try {
+    const { question } = req.body;
 
-    if (stderr) {
-      console.error("Python stderr:", stderr);
-      return res.status(500).json({
-        success: false,
-        error: "Error running Python script",
-        details: stderr
-      });
+    if (!question) {
+      return res.status(400).json({ error: 'Question is required' });
     }
 
-    let pythonResult;
-    try {
-      pythonResult = JSON.parse(stdout.trim());
-    } catch (parseError) {
-      return res.status(500).json({
-        success: false,
-        error: "Failed to parse Python response",
-        rawOutput: stdout
+    const userData = await getAgentUser(req.user.userId);
+    if (!userData || !userData.designation) {
+      return res.status(404).json({
+        error: 'User or designation not found'
       });
     }
 
-    res.json(pythonResult);
+    const agentResponse = await agentRequest('/query/stream', {
+      question,
+      user_email: userData.employee_email,
+      designation: userData.designation
+    });
+
+    if (!(req.headers.accept || '').includes('text/event-stream')) {
+      res.setHeader('Content-Type', 'application/x-ndjson');
+      res.flushHeaders();
+      for await (const chunk of agentResponse.body) {
+        res.write(chunk);
+      }
+      return res.end();
+    }
+
+    res.setHeader('Content-Type', 'text/event-stream');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.setHeader('Connection', 'keep-alive');
+    res.flushHeaders();
+
+    const decoder = new TextDecoder();
+    let buffered = '';
+    const sendEvent = (line) => {
+      if (!line.trim()) return;
+      const { type } = JSON.parse(line);
+      res.write(`event: ${type}\ndata: ${line}\n\n`);
+    };
+    for await (const chunk of agentResponse.body) {
+      buffered += decoder.decode(chunk, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      lines.forEach(sendEvent);
+    }
+    sendEvent(buffered + decoder.decode());
+    res.end();
 
   } catch (error) {
-    console.error('Query processing failed:', error.message);
+    console.error('Streaming query failed:', error.message);
+    if (res.headersSent) {
+      return res.end();
+    }
     res.status(500).json({
       error: "Query processing failed",
       details: error.message
     });
   }
 });
+
 // Health check
 app.get('/api/health', (req, res) => {
   res.json({ status: 'OK', message: 'Server is running' });
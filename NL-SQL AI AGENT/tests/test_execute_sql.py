@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from contextlib import contextmanager
+from core.nodes import execute_sql
+from core.nodes.execute_sql import _execute, _read_only
+
+
+class _Result:
+    returns_rows = False
+    rowcount = 1
+
+    def keys(self):
+        return []
+
+
+class _Connection:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None, **kwargs):
+        self.statements.append(str(statement))
+        return _Result()
+
+
+class _Engine:
+    def __init__(self):
+        self.conn = _Connection()
+
+    @contextmanager
+    def begin(self):
+        yield self.conn
+
+
+def _state(sql, writable=()):
+    return {"sql_query": sql, "allowed_tables": ["orders"], "writable_tables": list(writable)}
+
+
+def test_select_runs_read_only_even_for_writers():
+    # setval() writes from inside a plain SELECT; only a read-only transaction stops it
+    assert _read_only(_state("SELECT setval('orders_id_seq', 1) FROM orders", ["orders"]))
+    assert _read_only(_state("SELECT * FROM orders"))
+
+
+def test_writes_on_writable_tables_are_not_read_only():
+    assert not _read_only(_state("UPDATE orders SET status = 'x'", ["orders"]))
+    assert _read_only(_state("UPDATE orders SET status = 'x'"))
+
+
+def test_read_only_is_set_before_the_statement(monkeypatch):
+    engine = _Engine()
+    monkeypatch.setattr(execute_sql, "get_engine", lambda db_name: engine)
+    _execute("SELECT setval('orders_id_seq', 1) FROM orders", timeout_ms=1000, read_only=True)
+    assert engine.conn.statements[0] == "SET TRANSACTION READ ONLY"
+    assert "setval" in engine.conn.statements[-1]
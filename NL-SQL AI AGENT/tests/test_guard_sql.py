@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.nodes.guard_sql import _apply_budget
+
+BUDGET = {"max_cost": 1000, "max_rows": 100, "statement_timeout_ms": 1000}
+
+
+def _limit(sql, plan_rows=5000):
+    state = {"sql_query": sql, "designation": "analyst"}
+    plan = {"Node Type": "Seq Scan", "Total Cost": 10, "Plan Rows": plan_rows}
+    return _apply_budget(state, plan, BUDGET)
+
+
+def test_limit_keeps_order_by():
+    out = _limit("SELECT id FROM orders ORDER BY created_at DESC;")
+    assert out["sql_query"] == "SELECT id FROM orders ORDER BY created_at DESC LIMIT 100"
+    assert out["query_plan"]["action"] == "limited"
+
+
+def test_larger_existing_limit_is_lowered():
+    out = _limit("SELECT id FROM orders ORDER BY id LIMIT 500 OFFSET 10")
+    assert out["sql_query"] == "SELECT id FROM orders ORDER BY id LIMIT 100 OFFSET 10"
+
+
+def test_smaller_existing_limit_is_kept():
+    sql = "SELECT id FROM orders ORDER BY id LIMIT 20"
+    out = _limit(sql)
+    assert out["sql_query"] == sql
+    assert out["query_plan"]["action"] == "allowed"
+
+
+def test_fetch_first_and_union_are_limited():
+    assert _limit("SELECT id FROM orders ORDER BY id FETCH FIRST 500 ROWS ONLY")["sql_query"] == \
+        "SELECT id FROM orders ORDER BY id LIMIT 100"
+    assert _limit("SELECT id FROM orders UNION SELECT id FROM customers ORDER BY 1")["sql_query"] == \
+        "SELECT id FROM orders UNION SELECT id FROM customers ORDER BY 1 LIMIT 100"
+
+
+def test_small_plans_are_untouched():
+    sql = "SELECT id FROM orders"
+    assert _limit(sql, plan_rows=10)["sql_query"] == sql
@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import operator
+from typing import TypedDict, List, Dict, Any, Annotated
+from langgraph.graph import StateGraph, END
+from utils.instrumentation import instrument_node, timed
+
+
+def _node(state):
+    with timed("db", "lookup"):
+        pass
+    return {**state, "answer": 42}
+
+
+async def _anode(state):
+    with timed("db", "lookup"):
+        pass
+    return {**state, "answer": 42}
+
+
+def _kinds(metrics):
+    return [(event["kind"], event["name"]) for event in metrics]
+
+
+def test_node_event_is_returned_with_call_events():
+    output = instrument_node("lookup_node", _node)({"metrics": []})
+    assert _kinds(output["metrics"]) == [("db", "lookup"), ("node", "lookup_node")]
+    assert output["metrics"][1]["duration_ms"] >= 0
+
+
+def test_async_node_event_is_returned():
+    output = asyncio.run(instrument_node("lookup_node", _anode)({"metrics": []}))
+    assert _kinds(output["metrics"]) == [("db", "lookup"), ("node", "lookup_node")]
+
+
+class _State(TypedDict):
+    answer: int
+    metrics: Annotated[List[Dict[str, Any]], operator.add]
+
+
+def test_graph_state_collects_node_events():
+    workflow = StateGraph(_State)
+    workflow.add_node("first", instrument_node("first", _node))
+    workflow.add_node("second", instrument_node("second", _node))
+    workflow.set_entry_point("first")
+    workflow.add_edge("first", "second")
+    workflow.add_edge("second", END)
+    result = workflow.compile().invoke({"answer": 0, "metrics": []})
+    assert [e["name"] for e in result["metrics"] if e["kind"] == "node"] == ["first", "second"]
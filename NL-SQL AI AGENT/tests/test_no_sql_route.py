@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from core.nodes.generate_sql import generate_sql_query, agenerate_sql_query
+from core.nodes.guard_sql import guard_sql_cost, aguard_sql_cost
+from core.nodes.decide_after_guard import decide_after_guard
+
+
+def _no_tables_state():
+    # What check_user_permissions leaves behind when no table resolved
+    return {
+        "question": "how is the weather today?",
+        "user_email": "user@example.com",
+        "designation": "analyst",
+        "tables_requested": [],
+        "crud_operation": "SELECT",
+        "allowed_tables": [],
+        "forbidden_tables": [],
+        "writable_tables": [],
+        "permission_status": "full",
+        "response": None,
+    }
+
+
+def test_no_tables_question_ends_with_fallback_answer():
+    state = guard_sql_cost(generate_sql_query(_no_tables_state()))
+    assert decide_after_guard(state) == "end"
+    assert state["response"] == "No valid SQL query was generated."
+
+
+def test_no_tables_question_async():
+    async def run():
+        return await aguard_sql_cost(await agenerate_sql_query(_no_tables_state()))
+    state = asyncio.run(run())
+    assert decide_after_guard(state) == "end"
+    assert state["response"] == "No valid SQL query was generated."
+
+
+def test_generation_error_is_kept():
+    state = {**_no_tables_state(), "sql_query": None, "response": "Error generating SQL: boom"}
+    assert guard_sql_cost(state)["response"] == "Error generating SQL: boom"
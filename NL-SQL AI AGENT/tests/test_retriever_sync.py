@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from core.nodes import embeddings1time
+
+
+def test_failed_sync_is_not_retried_on_every_request(monkeypatch):
+    calls = []
+
+    def failing_sync():
+        calls.append(1)
+        raise ConnectionError("vector store down")
+
+    def missing_index(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(embeddings1time, "retriever", None)
+    monkeypatch.setattr(embeddings1time, "_sync_failed_at", 0.0)
+    monkeypatch.setattr(embeddings1time, "VECTOR_BACKEND", "local")
+    monkeypatch.setattr(embeddings1time, "sync_schema_embeddings", failing_sync)
+    monkeypatch.setattr(embeddings1time.LocalVectorIndex, "load", staticmethod(missing_index))
+
+    for _ in range(3):
+        with pytest.raises(FileNotFoundError):
+            embeddings1time.get_retriever()
+    assert len(calls) == 1
+
+    # Once the backoff has passed the next request tries again
+    monkeypatch.setattr(embeddings1time, "_sync_failed_at", 0.0)
+    with pytest.raises(FileNotFoundError):
+        embeddings1time.get_retriever()
+    assert len(calls) == 2
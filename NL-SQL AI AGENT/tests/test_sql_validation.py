@@ -0,0 +1,102 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from utils.sql_validation import SQLValidationError, extract_sql_text, parse_sql, validate_sql
+
+ALLOWED = ["orders", "customers"]
+
+
+def test_plain_select_passes():
+    parsed = validate_sql("SELECT o.id, c.name FROM orders o JOIN customers c ON c.id = o.customer_id", ALLOWED)
+    assert parsed["statement_type"] == "SELECT"
+    assert parsed["tables"] == ["orders", "customers"]
+
+
+def test_table_outside_allowed_set_is_rejected():
+    with pytest.raises(SQLValidationError):
+        validate_sql("SELECT * FROM salaries", ALLOWED)
+
+
+def test_cte_shadowing_a_real_table_is_rejected():
+    # The CTE body reads the real table even though its alias has the same name
+    with pytest.raises(SQLValidationError):
+        validate_sql("WITH salaries AS (SELECT * FROM public.salaries) SELECT * FROM salaries", ALLOWED)
+    with pytest.raises(SQLValidationError):
+        validate_sql("WITH salaries AS (SELECT * FROM salaries) SELECT * FROM salaries", ALLOWED)
+
+
+def test_cte_references_are_not_tables():
+    parsed = validate_sql("WITH recent AS (SELECT * FROM orders) SELECT * FROM recent", ALLOWED)
+    assert parsed["tables"] == ["orders"]
+
+
+def test_cte_is_only_visible_after_its_definition():
+    # b is referenced before it is defined, so it means the real table b
+    assert parse_sql("WITH a AS (SELECT * FROM b), b AS (SELECT 1) SELECT * FROM a")["tables"] == ["b"]
+
+
+def test_recursive_cte_references_itself():
+    parsed = parse_sql("WITH RECURSIVE r AS (SELECT 1 AS n UNION ALL SELECT n + 1 FROM r) SELECT * FROM r")
+    assert parsed["tables"] == []
+
+
+def test_cte_in_subquery_does_not_hide_outer_table():
+    sql = "SELECT * FROM salaries WHERE id IN (WITH salaries AS (SELECT 1) SELECT * FROM salaries)"
+    assert parse_sql(sql)["tables"] == ["salaries"]
+
+
+def test_other_schema_is_rejected():
+    with pytest.raises(SQLValidationError):
+        validate_sql("SELECT * FROM other_schema.orders", ALLOWED)
+    with pytest.raises(SQLValidationError):
+        validate_sql("SELECT * FROM otherdb.public.orders", ALLOWED)
+
+
+def test_configured_schema_is_accepted():
+    assert validate_sql("SELECT * FROM public.orders", ALLOWED)["tables"] == ["orders"]
+
+
+def test_quoted_identifiers_keep_case():
+    assert parse_sql('SELECT * FROM "Orders"')["tables"] == ["Orders"]
+    with pytest.raises(SQLValidationError):
+        validate_sql('SELECT * FROM "Orders"', ALLOWED)
+
+
+def test_multiple_statements_are_rejected():
+    with pytest.raises(SQLValidationError):
+        parse_sql("SELECT * FROM orders; DELETE FROM orders")
+
+
+def test_no_table_is_rejected():
+    with pytest.raises(SQLValidationError):
+        validate_sql("SELECT pg_sleep(10)", ALLOWED)
+
+
+def test_writes_need_writable_tables():
+    with pytest.raises(SQLValidationError):
+        validate_sql("DELETE FROM orders", ALLOWED)
+    assert validate_sql("DELETE FROM orders", ALLOWED, ["orders"])["statement_type"] == "DELETE"
+
+
+def test_data_modifying_cte_counts_as_write():
+    sql = "WITH d AS (DELETE FROM orders RETURNING *) SELECT * FROM d"
+    assert parse_sql(sql)["statement_type"] == "WRITE"
+    with pytest.raises(SQLValidationError):
+        validate_sql(sql, ALLOWED)
+
+
+def test_locking_clauses_are_rejected():
+    for sql in (
+        "SELECT * FROM orders FOR UPDATE",
+        "SELECT * FROM orders FOR NO KEY UPDATE SKIP LOCKED",
+        "SELECT * FROM (SELECT * FROM orders FOR SHARE) o",
+    ):
+        with pytest.raises(SQLValidationError):
+            validate_sql(sql, ALLOWED, ["orders"])
+
+
+def test_extract_sql_text():
+    assert extract_sql_text("```sql\nSELECT 1\n```") == "SELECT 1"
+    assert extract_sql_text("Here you go: SELECT * FROM orders; DROP TABLE x;") == "SELECT * FROM orders;"
+    assert extract_sql_text("no query") is None
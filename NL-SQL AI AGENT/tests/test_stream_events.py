@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'fullstack', '4i_aiagent')))
+import asyncio
+import json
+from typing import TypedDict
+from langgraph.graph import StateGraph, END
+from core.agentgraph import node
+import run_agent
+
+
+class _State(TypedDict):
+    question: str
+    row_count: int
+    response: str
+
+
+def run_sql_query(state):
+    return {"row_count": 3}
+
+
+async def arun_sql_query(state):
+    return {"row_count": 3}
+
+
+def format_answer(state):
+    return {"response": "3 rows"}
+
+
+def test_each_node_reports_progress_once(monkeypatch):
+    workflow = StateGraph(_State)
+    workflow.add_node("run_sql_query", node("run_sql_query", run_sql_query, arun_sql_query))
+    workflow.add_node("format_answer", node("format_answer", format_answer))
+    workflow.set_entry_point("run_sql_query")
+    workflow.add_edge("run_sql_query", "format_answer")
+    workflow.add_edge("format_answer", END)
+    monkeypatch.setattr(run_agent, "app", workflow.compile())
+
+    lines = []
+    asyncio.run(run_agent.astream_question("q", "user@example.com", "analyst", lines.append))
+    events = [json.loads(line) for line in lines]
+
+    assert [e["node"] for e in events if e["type"] == "progress"] == ["run_sql_query"]
+    # No narrative LLM here, so the rendered answer arrives as one token
+    assert [e["content"] for e in events if e["type"] == "token"] == ["3 rows"]
+    assert events[-1]["type"] == "result" and events[-1]["success"]
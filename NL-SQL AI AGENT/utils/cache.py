@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Once the stored entries weigh more than `maxsize`, the least recently used
+    ones are evicted. Every entry weighs 1 unless a `weigher(value)` is given,
+    e.g. to bound the cache by approximate bytes. `ttl` can be overridden per
+    entry in `set`.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, weigher=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._weigher = weigher
+        self._weight = 0
+        self._data = OrderedDict()  # key -> (value, expires_at, weight)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        weight = self._weigher(value) if self._weigher else 1
+        if weight > self.maxsize:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, expires_at, weight)
+            self._weight += weight
+            while self._weight > self.maxsize:
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key):
+        self._weight -= self._data.pop(key)[2]
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key matches `predicate(key)`."""
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+                self._weight = 0
+                return
+            for key in [k for k in self._data if predicate(k)]:
+                self._pop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "weight": self._weight, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over question embeddings, partitioned by scope.
+
+    `lookup` returns the value stored for the most similar vector in the same
+    scope, provided its cosine similarity reaches `threshold`; an optional
+    `match(value)` predicate restricts the candidates. Entries are
+    evicted least recently used first once `maxsize` is exceeded.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 512):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # (scope, key) -> (unit vector, value)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, scope, vector, match=None):
+        query = self._normalize(vector)
+        with self._lock:
+            keys = [
+                k for k in self._data
+                if k[0] == scope and (match is None or match(self._data[k][1]))
+            ]
+            if keys:
+                matrix = np.vstack([self._data[k][0] for k in keys])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._data.move_to_end(keys[best])
+                    self.hits += 1
+                    return self._data[keys[best]][1]
+            self.misses += 1
+            return None
+
+    def add(self, scope, key, vector, value):
+        with self._lock:
+            self._data[(scope, key)] = (self._normalize(vector), value)
+            self._data.move_to_end((scope, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, scope=None):
+        with self._lock:
+            if scope is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[0] == scope]:
+                del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
@@ -1,11 +1,288 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import select
+import threading
+import time
+import weakref
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from langchain_community.utilities import SQLDatabase
-from config.settings import DB_CREDENTIALS1
-def get_db_connection(db_name: str = "supplydb1") -> SQLDatabase:
-    pgsql_uri1 = (
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from utils.instrumentation import timed
+from config.settings import (
+    DB_CREDENTIALS1,
+    SCHEMA_CACHE_TTL,
+    SCHEMA_FINGERPRINT_INTERVAL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_SAMPLE_ROWS_IN_TABLE_INFO,
+)
+
+# Engines and SQLDatabase wrappers are built on first use and shared by every
+# caller, so importing a node never opens a connection or reflects a schema.
+_engines = {}
+# event loop -> {db_name: engine}; entries go away with their loop
+_async_engines = weakref.WeakKeyDictionary()
+_databases = {}
+_schema_caches = {}
+_registry_lock = threading.Lock()
+
+def get_db_uri(db_name: str) -> str:
+    return (
         f"postgresql+psycopg2://{DB_CREDENTIALS1['user']}:{DB_CREDENTIALS1['password']}"
         f"@{DB_CREDENTIALS1['host']}:{DB_CREDENTIALS1['port']}/{db_name}"
     )
-    return SQLDatabase.from_uri(pgsql_uri1, engine_args={"connect_args": {"connect_timeout": 3600}})
+
+def get_engine(db_name: str) -> Engine:
+    """Return the process-wide pooled engine for `db_name`, creating it on first use."""
+    with _registry_lock:
+        engine = _engines.get(db_name)
+        if engine is None:
+            connect_args = {"connect_timeout": 3600}
+            if DB_STATEMENT_TIMEOUT_MS:
+                connect_args["options"] = f"-c statement_timeout={int(DB_STATEMENT_TIMEOUT_MS)}"
+            engine = create_engine(
+                get_db_uri(db_name),
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=True,
+                connect_args=connect_args
+            )
+            _engines[db_name] = engine
+        return engine
+
+def get_async_engine(db_name: str) -> AsyncEngine:
+    """asyncpg-backed counterpart of get_engine for the async node variants.
+
+    asyncpg connections belong to the event loop that opened them, so engines
+    are kept per loop; run the async graph on one long-lived loop per process,
+    or await dispose_async_engines() before a short-lived loop (asyncio.run) ends.
+    """
+    loop = asyncio.get_running_loop()
+    with _registry_lock:
+        engines = _async_engines.setdefault(loop, {})
+        engine = engines.get(db_name)
+        if engine is None:
+            connect_args = {"timeout": 3600}
+            if DB_STATEMENT_TIMEOUT_MS:
+                connect_args["server_settings"] = {"statement_timeout": str(int(DB_STATEMENT_TIMEOUT_MS))}
+            engine = create_async_engine(
+                get_db_uri(db_name).replace("postgresql+psycopg2://", "postgresql+asyncpg://"),
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=True,
+                connect_args=connect_args
+            )
+            engines[db_name] = engine
+        return engine
+
+async def dispose_async_engines():
+    """Close the pools of every async engine created on the running loop."""
+    with _registry_lock:
+        engines = _async_engines.pop(asyncio.get_running_loop(), {})
+    for engine in engines.values():
+        await engine.dispose()
+
+def get_db_connection(db_name: str = "supplydb1", include_tables: list = None) -> SQLDatabase:
+    """Return the shared SQLDatabase for `db_name` (optionally limited to `include_tables`).
+
+    Tables are reflected lazily, only when get_table_info asks for them.
+    """
+    key = (db_name, tuple(sorted(include_tables)) if include_tables else None)
+    with _registry_lock:
+        db = _databases.get(key)
+    if db is not None:
+        return db
+
+    db = SQLDatabase(
+        get_engine(db_name),
+        include_tables=include_tables,
+        sample_rows_in_table_info=DB_SAMPLE_ROWS_IN_TABLE_INFO,
+        lazy_table_reflection=True
+    )
+    with _registry_lock:
+        return _databases.setdefault(key, db)
+
+def get_schema_cache(db_name: str = "supplydb1") -> "SchemaCache":
+    with _registry_lock:
+        cache = _schema_caches.get(db_name)
+        if cache is None:
+            cache = _schema_caches[db_name] = SchemaCache(db_name)
+        return cache
+
+def listen(db_name: str, channel: str, callback) -> threading.Thread:
+    """Call `callback(payload)` for every NOTIFY on `channel` in a daemon thread.
+
+    The thread reconnects on errors and calls `callback(None)` after every
+    (re)connect, since notifications sent while disconnected are lost.
+    """
+    def _listen_forever():
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(
+                    dbname=db_name,
+                    user=DB_CREDENTIALS1["user"],
+                    password=DB_CREDENTIALS1["password"],
+                    host=DB_CREDENTIALS1["host"],
+                    port=DB_CREDENTIALS1["port"],
+                )
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                callback(None)
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        callback(conn.notifies.pop(0).payload or None)
+            except Exception as e:
+                print(f"LISTEN {channel} on {db_name} failed: {e}")
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    thread = threading.Thread(target=_listen_forever, name=f"listen-{channel}", daemon=True)
+    thread.start()
+    return thread
+
+
+# One row per table: md5 over the ordered column names, types and nullability.
+# Reads only the catalog, so checking every table costs a single round trip.
+SCHEMA_FINGERPRINT_QUERY = text("""
+SELECT
+    c.relname AS table_name,
+    md5(string_agg(
+        a.attname || ':' || format_type(a.atttypid, a.atttypmod) || ':' || a.attnotnull::text,
+        ',' ORDER BY a.attnum
+    )) AS fingerprint
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid
+WHERE c.relname = ANY(:table_list)
+AND n.nspname = current_schema()
+AND a.attnum > 0
+AND NOT a.attisdropped
+GROUP BY c.relname
+""")
+
+
+# Cumulative write counters per table. They only grow, so any change between
+# two reads means rows were inserted, updated or deleted in between. The
+# statistics system may lag writes slightly; callers should pair this with a TTL.
+TABLE_VERSION_QUERY = text("""
+SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+FROM pg_stat_user_tables
+WHERE relname = ANY(:table_list)
+AND schemaname = current_schema()
+""")
+
+def get_table_versions(db_name: str, tables: list) -> dict:
+    """Map each table to an opaque change marker; unknown tables are omitted."""
+    if not tables:
+        return {}
+    with get_engine(db_name).connect() as conn:
+        result = conn.execute(TABLE_VERSION_QUERY, {"table_list": list(tables)})
+        return {row[0]: f"{row[1]}:{row[2]}:{row[3]}" for row in result}
+
+
+class SchemaCache:
+    """Caches SQLDatabase.get_table_info output (DDL + sample rows) per table.
+
+    An entry is refetched when it is older than `ttl`, or when the table's
+    catalog fingerprint changes. Fingerprints are checked at most once every
+    `fingerprint_interval` seconds per table.
+    """
+
+    def __init__(self, db_name: str, ttl: float = SCHEMA_CACHE_TTL,
+                 fingerprint_interval: float = SCHEMA_FINGERPRINT_INTERVAL):
+        self._db_name = db_name
+        self._ttl = ttl
+        self._fingerprint_interval = fingerprint_interval
+        self._entries = {}
+        self._checked = {}  # table -> (fingerprint, checked_at), for current_fingerprints
+        self._lock = threading.Lock()
+
+    def fingerprints(self, tables: list) -> dict:
+        if not tables:
+            return {}
+        with get_engine(self._db_name).connect() as conn:
+            result = conn.execute(SCHEMA_FINGERPRINT_QUERY, {"table_list": list(tables)})
+            return {row[0]: row[1] for row in result}
+
+    def current_fingerprints(self, tables: list) -> dict:
+        """Fingerprints of `tables`, re-read at most once every fingerprint_interval.
+
+        Cheap enough to key other per-table caches on; unknown tables map to None.
+        """
+        now = time.time()
+        with self._lock:
+            known = {t: self._checked.get(t) for t in tables}
+        to_check = [t for t, c in known.items() if c is None or now - c[1] > self._fingerprint_interval]
+        if to_check:
+            fetched = self.fingerprints(to_check)
+            with self._lock:
+                for table in to_check:
+                    known[table] = self._checked[table] = (fetched.get(table), now)
+        return {t: c[0] for t, c in known.items()}
+
+    def get_table_info(self, table: str) -> str:
+        return self.get_tables_info([table])[table]
+
+    def get_tables_info(self, tables: list) -> dict:
+        now = time.time()
+        with self._lock:
+            entries = {table: self._entries.get(table) for table in tables}
+
+        stale = [t for t, e in entries.items() if e is None or now - e["loaded_at"] > self._ttl]
+        to_check = [t for t, e in entries.items()
+                    if t not in stale and now - e["checked_at"] > self._fingerprint_interval]
+
+        fingerprints = {}
+        if stale or to_check:
+            try:
+                fingerprints = self.fingerprints(stale + to_check)
+            except Exception as e:
+                # Fall back to TTL-only expiry if the catalog can't be read
+                print(f"Schema fingerprint check failed: {e}")
+                fingerprints = {t: entries[t]["fingerprint"] for t in to_check}
+
+        for table in to_check:
+            if fingerprints.get(table) != entries[table]["fingerprint"]:
+                stale.append(table)
+            else:
+                entries[table] = {**entries[table], "checked_at": now}
+
+        for table in stale:
+            with timed("db", "get_table_info", table=table):
+                info = get_db_connection(self._db_name).get_table_info([table])
+            entries[table] = {
+                "info": info,
+                "fingerprint": fingerprints.get(table),
+                "loaded_at": now,
+                "checked_at": now,
+            }
+
+        with self._lock:
+            self._entries.update(entries)
+        return {table: entry["info"] for table, entry in entries.items()}
+
+    def invalidate(self, table: str = None):
+        with self._lock:
+            if table is None:
+                self._entries.clear()
+                self._checked.clear()
+            else:
+                self._entries.pop(table, None)
+                self._checked.pop(table, None)
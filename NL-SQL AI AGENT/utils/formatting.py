@@ -0,0 +1,92 @@
+import datetime
+import decimal
+import html
+
+# Renders SQL results locally so numbers are shown exactly as Postgres
+# returned them, without a round trip through the LLM.
+
+def format_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, decimal.Decimal):
+        return format(value, "f")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool)
+
+def to_markdown_table(columns, rows, max_rows=None) -> str:
+    if not columns:
+        return ""
+    shown = rows if max_rows is None else rows[:max_rows]
+
+    def cell(value):
+        return format_value(value).replace("|", "\\|").replace("\n", " ")
+
+    lines = [
+        "| " + " | ".join(cell(c) for c in columns) + " |",
+        "| " + " | ".join("---" for _ in columns) + " |",
+    ]
+    lines += ["| " + " | ".join(cell(v) for v in row) + " |" for row in shown]
+    if len(shown) < len(rows):
+        lines.append(f"\n_Showing the first {len(shown)} of {len(rows)} rows._")
+    return "\n".join(lines)
+
+def to_html_table(columns, rows, max_rows=None) -> str:
+    if not columns:
+        return ""
+    shown = rows if max_rows is None else rows[:max_rows]
+    header = "".join(f"<th>{html.escape(str(c))}</th>" for c in columns)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(format_value(v))}</td>" for v in row) + "</tr>"
+        for row in shown
+    )
+    return f"<table><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>"
+
+def column_aggregates(columns, rows) -> dict:
+    """min/max/sum/avg for every column whose non-null values are all numeric."""
+    aggregates = {}
+    for i, column in enumerate(columns):
+        if column == "id" or column.endswith("_id"):
+            continue
+        values = [row[i] for row in rows if row[i] is not None]
+        if not values or not all(_is_number(v) for v in values):
+            continue
+        if any(isinstance(v, float) for v in values):
+            values = [float(v) for v in values]
+        total = sum(values)
+        aggregates[column] = {
+            "min": min(values),
+            "max": max(values),
+            "sum": total,
+            "avg": total / len(values),
+        }
+    return aggregates
+
+def summarize_result(columns, rows, total_rows=None, truncated=False, max_columns=3) -> str:
+    """Short templated summary: row count plus totals for a few numeric columns."""
+    if not rows:
+        return "The query returned no rows."
+
+    if truncated:
+        count = f"more than {len(rows)}" if total_rows is None else total_rows
+        # Totals over a truncated set would mislead, so stop at the count
+        return f"The query returned {count} rows; only the first {len(rows)} were fetched."
+
+    count = len(rows)
+    summary = f"The query returned {count} row{'s' if count != 1 else ''}"
+    summary += f" with {len(columns)} column{'s' if len(columns) != 1 else ''}: {', '.join(columns)}."
+    if count == 1:
+        # Totals over a single row repeat the table
+        return summary
+
+    for column, stats in list(column_aggregates(columns, rows).items())[:max_columns]:
+        summary += (
+            f"\n- {column}: total {format_value(stats['sum'])},"
+            f" min {format_value(stats['min'])}, max {format_value(stats['max'])}"
+        )
+    return summary
@@ -1,31 +1,40 @@
 import re
-def extract_sql_query(text):
-    code_block_pattern = re.compile(r'```sql\s*(.*?)\s*```', re.DOTALL | re.IGNORECASE)
-    code_block_match = code_block_pattern.search(text)
-    if code_block_match:
-        return code_block_match.group(1).strip()
+# Quoted literals and identifiers are kept verbatim when normalizing SQL
+_SQL_QUOTED_PATTERN = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_SQL_TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+((?:"[^"]+"|\w+)(?:\.(?:"[^"]+"|\w+))?)', re.IGNORECASE)
+_QUESTION_QUOTED_PATTERN = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+_QUESTION_NUMBER_PATTERN = re.compile(r"\b\d+(?:[.,]\d+)*\b")
 
-    sql_keyword_pattern = re.compile(r"""
-        \b(SELECT|INSERT|UPDATE|DELETE|CREATE\s+TABLE|DROP\s+TABLE|ALTER\s+TABLE|TRUNCATE|
-        PRAGMA|COPY|GRANT|REVOKE|COMMENT|ANALYZE|VACUUM|CLUSTER|DISCARD|EXPLAIN|LISTEN|NOTIFY|
-        UNLISTEN|SET|RESET|SHOW|START\s+TRANSACTION|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE\s+SAVEPOINT|
-        PREPARE|EXECUTE|DEALLOCATE|DECLARE|FETCH|MOVE|CLOSE|DO|REINDEX|REFRESH\s+MATERIALIZED\s+VIEW|
-        CREATE\s+EXTENSION|DROP\s+EXTENSION|CREATE\s+SCHEMA|DROP\s+SCHEMA|CREATE\s+SEQUENCE|DROP\s+SEQUENCE|
-        CREATE\s+INDEX|DROP\s+INDEX|CREATE\s+VIEW|DROP\s+VIEW|CREATE\s+FUNCTION|DROP\s+FUNCTION|
-        CREATE\s+TRIGGER|DROP\s+TRIGGER|CREATE\s+RULE|DROP\s+RULE|CREATE\s+AGGREGATE|DROP\s+AGGREGATE|
-        CREATE\s+TYPE|DROP\s+TYPE|CREATE\s+DOMAIN|DROP\s+DOMAIN|CREATE\s+OPERATOR|DROP\s+OPERATOR|
-        CREATE\s+LANGUAGE|DROP\s+LANGUAGE|CREATE\s+TEXT\s+SEARCH\s+CONFIGURATION|DROP\s+TEXT\s+SEARCH\s+CONFIGURATION|
-        CREATE\s+TEXT\s+SEARCH\s+DICTIONARY|DROP\s+TEXT\s+SEARCH\s+DICTIONARY|CREATE\s+TEXT\s+SEARCH\s+PARSER|
-        DROP\s+TEXT\s+SEARCH\s+PARSER|CREATE\s+TEXT\s+SEARCH\s+TEMPLATE|DROP\s+TEXT\s+SEARCH\s+TEMPLATE|
-        CREATE\s+TABLESPACE|DROP\s+TABLESPACE|CREATE\s+USER\s+MAPPING|DROP\s+USER\s+MAPPING|
-        CREATE\s+FOREIGN\s+TABLE|DROP\s+FOREIGN\s+TABLE|CREATE\s+SERVER|DROP\s+SERVER|
-        CREATE\s+FOREIGN\s+DATA\s+WRAPPER|DROP\s+FOREIGN\s+DATA\s+WRAPPER|IMPORT\s+FOREIGN\s+SCHEMA|
-        CREATE\s+PUBLICATION|DROP\s+PUBLICATION|CREATE\s+SUBSCRIPTION|DROP\s+SUBSCRIPTION|
-        CREATE\s+TRANSFORM|DROP\s+TRANSFORM)\b.*?;
-    """, re.IGNORECASE | re.DOTALL | re.VERBOSE)
+def normalize_sql(sql):
+    """Canonical form of a statement for cache keys.
 
-    sql_keyword_match = sql_keyword_pattern.search(text)
-    if sql_keyword_match:
-        return sql_keyword_match.group(0).strip()
+    Whitespace is collapsed and unquoted text lowercased; string literals and
+    quoted identifiers are left untouched. A trailing semicolon is dropped.
+    """
+    parts = _SQL_QUOTED_PATTERN.split(sql.strip().rstrip(";").strip())
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part).lower()
+        for i, part in enumerate(parts)
+    ).strip()
 
-    return None
\ No newline at end of file
+def extract_table_names(sql):
+    """Table names following FROM/JOIN, without schema prefix or quotes."""
+    tables = []
+    for match in _SQL_TABLE_PATTERN.findall(sql):
+        name = match.split(".")[-1]
+        name = name[1:-1] if name.startswith('"') else name.lower()
+        if name not in tables:
+            tables.append(name)
+    return tables
+
+def question_literals(question):
+    """Values a question names: quoted strings, numbers and capitalized words
+    past the first. Questions that differ only in these need different SQL."""
+    literals = [a or b for a, b in _QUESTION_QUOTED_PATTERN.findall(question)]
+    unquoted = _QUESTION_QUOTED_PATTERN.sub(" ", question)
+    literals += _QUESTION_NUMBER_PATTERN.findall(unquoted)
+    literals += [
+        word.strip(".,;:!?()") for word in unquoted.split()[1:]
+        if word[:1].isupper()
+    ]
+    return sorted(set(literals))
@@ -0,0 +1,147 @@
+import contextvars
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    from prometheus_client import Counter, Histogram
+except ImportError:
+    Counter = Histogram = None
+
+# Per-node timings of the agent graph and of the external calls made inside
+# each node (LLM, embeddings, vector search, Postgres). Every wrapped node
+# returns its events under the "metrics" state key, which AgentState merges
+# across nodes; when prometheus_client is installed the same events are also
+# exported as metrics of the long-running process.
+
+_events = contextvars.ContextVar("agent_metrics", default=None)
+
+if Histogram is not None:
+    NODE_SECONDS = Histogram("agent_node_duration_seconds", "Agent graph node wall time", ["node"])
+    CALL_SECONDS = Histogram("agent_call_duration_seconds", "External call wall time", ["kind", "name"])
+    LLM_TOKENS = Counter("agent_llm_tokens_total", "LLM tokens", ["model", "direction"])
+    CACHE_EVENTS = Counter("agent_cache_events_total", "Cache lookups", ["cache", "result"])
+    CALL_ROWS = Counter("agent_call_rows_total", "Rows returned by database calls", ["name"])
+
+
+def record(kind: str, name: str, duration_ms: float = None, **fields):
+    """Add one event to the running node's metrics and to Prometheus."""
+    event = {"kind": kind, "name": name, **fields}
+    if duration_ms is not None:
+        event["duration_ms"] = round(duration_ms, 2)
+    events = _events.get()
+    if events is not None:
+        events.append(event)
+
+    if Histogram is None:
+        return
+    if duration_ms is not None:
+        if kind == "node":
+            NODE_SECONDS.labels(name).observe(duration_ms / 1000)
+        else:
+            CALL_SECONDS.labels(kind, name).observe(duration_ms / 1000)
+    if "cache_hit" in fields:
+        CACHE_EVENTS.labels(name, "hit" if fields["cache_hit"] else "miss").inc()
+    if fields.get("rows") is not None:
+        CALL_ROWS.labels(name).inc(fields["rows"])
+    for direction in ("input_tokens", "output_tokens"):
+        if fields.get(direction):
+            LLM_TOKENS.labels(fields.get("model", ""), direction).inc(fields[direction])
+
+
+@contextmanager
+def timed(kind: str, name: str, **fields):
+    """Time the enclosed call; the yielded dict can add fields such as rows."""
+    started = time.perf_counter()
+    extra = dict(fields)
+    try:
+        yield extra
+    except Exception as e:
+        extra["error"] = type(e).__name__
+        raise
+    finally:
+        record(kind, name, (time.perf_counter() - started) * 1000, **extra)
+
+
+def _finish(name: str, events: list, started: float, output):
+    record("node", name, (time.perf_counter() - started) * 1000)
+    if not isinstance(output, dict):
+        return output
+    # Nodes return {**state, ...}; drop the metrics they were handed so the
+    # reducer only appends this node's events
+    return {**{k: v for k, v in output.items() if k != "metrics"}, "metrics": events}
+
+
+def instrument_node(name: str, func):
+    """Wrap a sync or async graph node so it reports its own metrics events."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state, **kwargs):
+            events = []
+            token = _events.set(events)
+            started = time.perf_counter()
+            try:
+                # _finish records the node event, so it runs before the reset
+                return _finish(name, events, started, await func(state, **kwargs))
+            finally:
+                _events.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state, **kwargs):
+        events = []
+        token = _events.set(events)
+        started = time.perf_counter()
+        try:
+            return _finish(name, events, started, func(state, **kwargs))
+        finally:
+            _events.reset(token)
+    return wrapper
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Records wall time and token usage of every chat model call."""
+
+    # Run in the caller's context so events land in the running node's list
+    run_inline = True
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        usage = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        if not usage:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            usage = {
+                "input_tokens": token_usage.get("prompt_tokens"),
+                "output_tokens": token_usage.get("completion_tokens"),
+            }
+        record(
+            "llm",
+            "chat_model",
+            (time.perf_counter() - started) * 1000 if started else None,
+            model=(response.llm_output or {}).get("model_name", ""),
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        record("llm", "chat_model", (time.perf_counter() - started) * 1000 if started else None,
+               error=type(error).__name__)
+
+
+llm_metrics_handler = LLMMetricsHandler()
@@ -0,0 +1,26 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from langchain_groq import ChatGroq
+from utils.instrumentation import llm_metrics_handler
+from config.settings import GROQ_API_KEY, LLM_MODEL
+if "GROQ_API_KEY" not in os.environ:
+    os.environ["GROQ_API_KEY"] = GROQ_API_KEY
+
+# One client per (model, temperature) for the whole process. Each ChatGroq
+# keeps pooled HTTP connections for both invoke and ainvoke, so sharing them
+# avoids a TLS handshake per node call.
+_llms = {}
+_llms_lock = threading.Lock()
+
+def get_llm(temperature: float, model: str = LLM_MODEL) -> ChatGroq:
+    with _llms_lock:
+        llm = _llms.get((model, temperature))
+        if llm is None:
+            llm = _llms[(model, temperature)] = ChatGroq(
+                model_name=model,
+                temperature=temperature,
+                callbacks=[llm_metrics_handler]
+            )
+        return llm
@@ -0,0 +1,248 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sqlalchemy import text
+from utils.cache import TTLCache
+from utils.db import get_engine, get_schema_cache
+from utils.schema_compactor import compact_schema, load_catalog, invalidate_catalog
+from config.settings import (
+    PRIVILEGES_DB_NAME,
+    SUPPLY_DB_NAME,
+    ROLE_BUNDLE_DIR,
+    ROLE_BUNDLE_CHECK_INTERVAL,
+    ROLE_BUNDLE_TTL,
+    ROLE_BUNDLE_VECTOR_CACHE_SIZE,
+)
+
+# A bundle is everything the agent needs to know about one designation:
+#   permissions      every role_privileges row for the role, as {"read", "write"}
+#   catalog          column/key metadata of the readable tables (schema_compactor)
+#   schemas          compact DDL per readable table
+#   fingerprints     catalog fingerprint per readable table (utils/db.SchemaCache)
+#   vectors          embedding of each table's DDL, for in-bundle schema search
+#
+# Bundles live in memory and on disk (one .npz holding the JSON metadata and
+# the vector matrix, replaced atomically). A bundle
+# read from disk, or flagged by invalidate_role_bundle (privileges NOTIFY), is
+# re-verified with one privileges query and one fingerprint query before use.
+# Fingerprints are also re-verified every ROLE_BUNDLE_CHECK_INTERVAL seconds.
+#
+# Building a bundle reads the catalog and embeds every readable table, so it
+# never happens on the request path: build_role_bundles.py precomputes them,
+# and a missing, changed or expired bundle is rebuilt by a background worker.
+# Until then get_role_bundle returns None (callers fall back to the cached
+# permission query and the shared retriever), or the still-valid old bundle.
+
+ROLE_PRIVILEGES_QUERY = text("""
+SELECT
+    table_name,
+    can_create,
+    can_read,
+    can_update,
+    can_delete
+FROM role_privileges
+WHERE role_name = :role_name
+""")
+
+ROLES_QUERY = text("SELECT DISTINCT role_name FROM role_privileges")
+
+BUNDLE_PATH = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), ROLE_BUNDLE_DIR)
+
+_bundles = {}
+_locks = {}
+_registry_lock = threading.Lock()
+# (table, fingerprint) -> vector; tables are shared by many roles, embed each once
+_table_vectors = TTLCache(maxsize=ROLE_BUNDLE_VECTOR_CACHE_SIZE, ttl=ROLE_BUNDLE_TTL)
+
+_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="role-bundles")
+_building = set()
+# Bumped by invalidate_role_bundle; a background build that overlapped an
+# invalidation re-verifies its result before first use
+_invalidations = 0
+
+def _lock_for(designation: str) -> threading.Lock:
+    with _registry_lock:
+        return _locks.setdefault(designation, threading.Lock())
+
+def _file_stem(designation: str) -> str:
+    safe = re.sub(r"[^\w.-]", "_", designation)
+    return os.path.join(BUNDLE_PATH, f"{safe}-{hashlib.md5(designation.encode('utf-8')).hexdigest()[:8]}")
+
+def fetch_permissions(designation: str) -> dict:
+    with get_engine(PRIVILEGES_DB_NAME).connect() as conn:
+        rows = conn.execute(ROLE_PRIVILEGES_QUERY, {"role_name": designation}).fetchall()
+    return {
+        row[0]: {"read": bool(row[2]), "write": bool(row[1] or row[3] or row[4])}
+        for row in rows
+    }
+
+def _readable(permissions: dict) -> list:
+    return sorted(table for table, p in permissions.items() if p["read"])
+
+def _embed(schemas: dict, fingerprints: dict, embeddings) -> dict:
+    vectors = {t: _table_vectors.get((t, fingerprints.get(t))) for t in schemas}
+    missing = [t for t, vector in vectors.items() if vector is None]
+    if missing and embeddings is not None:
+        for table, vector in zip(missing, embeddings.embed_documents([schemas[t] for t in missing])):
+            vectors[table] = np.asarray(vector, dtype=np.float32)
+            _table_vectors.set((table, fingerprints.get(table)), vectors[table])
+    return {t: vector for t, vector in vectors.items() if vector is not None}
+
+def build_role_bundle(designation: str, embeddings=None, permissions: dict = None,
+                      fingerprints: dict = None) -> dict:
+    if permissions is None:
+        permissions = fetch_permissions(designation)
+    readable = _readable(permissions)
+    if fingerprints is None:
+        fingerprints = get_schema_cache(SUPPLY_DB_NAME).fingerprints(readable)
+    catalog = load_catalog(SUPPLY_DB_NAME, readable)
+    schemas = {
+        table: compact_schema(SUPPLY_DB_NAME, "", [table], token_budget=sys.maxsize,
+                              include_samples=False, catalog=catalog)
+        for table in catalog
+    }
+    return {
+        "designation": designation,
+        "permissions": permissions,
+        "catalog": catalog,
+        "schemas": schemas,
+        "fingerprints": fingerprints,
+        "vectors": _embed(schemas, fingerprints, embeddings),
+        "built_at": time.time(),
+        "verified_at": time.time(),
+    }
+
+def save_role_bundle(bundle: dict):
+    os.makedirs(BUNDLE_PATH, exist_ok=True)
+    stem = _file_stem(bundle["designation"])
+    vector_tables = list(bundle["vectors"])
+    data = {k: v for k, v in bundle.items() if k not in ("vectors", "verified_at")}
+    data["vector_tables"] = vector_tables
+
+    # One file, swapped in with a single os.replace, so readers never mix versions
+    matrix = np.vstack([bundle["vectors"][t] for t in vector_tables]) if vector_tables \
+        else np.zeros((0, 0), dtype=np.float32)
+    metadata = np.frombuffer(json.dumps(data).encode("utf-8"), dtype=np.uint8)
+    tmp = f"{stem}.npz.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, metadata=metadata, vectors=matrix)
+    os.replace(tmp, stem + ".npz")
+
+def _load_role_bundle(designation: str) -> dict:
+    stem = _file_stem(designation)
+    try:
+        with np.load(stem + ".npz") as f:
+            data = json.loads(f["metadata"].tobytes().decode("utf-8"))
+            matrix = f["vectors"]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Could not load role bundle for {designation}: {e}")
+        return None
+    data["vectors"] = dict(zip(data.pop("vector_tables"), matrix))
+    for table, vector in data["vectors"].items():
+        if _table_vectors.get((table, data["fingerprints"].get(table))) is None:
+            _table_vectors.set((table, data["fingerprints"].get(table)), vector)
+    # Privileges or schema may have changed while the bundle sat on disk
+    data["verified_at"] = 0
+    return data
+
+def _background_build(designation: str, embeddings):
+    generation = _invalidations
+    try:
+        bundle = build_role_bundle(designation, embeddings)
+        save_role_bundle(bundle)
+        if generation != _invalidations:
+            bundle["verified_at"] = 0
+        with _lock_for(designation):
+            _bundles[designation] = bundle
+    except Exception as e:
+        print(f"Role bundle build for {designation} failed: {e}")
+    finally:
+        with _registry_lock:
+            _building.discard(designation)
+
+def build_in_background(designation: str, embeddings=None):
+    """Queue a rebuild of the designation's bundle unless one is already queued."""
+    with _registry_lock:
+        if designation in _building:
+            return
+        _building.add(designation)
+    _builder.submit(_background_build, designation, embeddings)
+
+def _still_valid(bundle: dict) -> bool:
+    """Re-check privileges and schema fingerprints; two small queries."""
+    permissions = fetch_permissions(bundle["designation"])
+    fingerprints = get_schema_cache(SUPPLY_DB_NAME).fingerprints(_readable(permissions))
+    if permissions == bundle["permissions"] and fingerprints == bundle["fingerprints"]:
+        return True
+    for table, fingerprint in fingerprints.items():
+        if bundle["fingerprints"].get(table) != fingerprint:
+            invalidate_catalog(SUPPLY_DB_NAME, table)
+    return False
+
+def get_role_bundle(designation: str, embeddings=None) -> dict:
+    """Return the designation's bundle, or None while it is being (re)built.
+
+    Never builds on the calling thread: a missing or outdated bundle is queued
+    for build_in_background with `embeddings`, which also fills in missing
+    table vectors.
+    """
+    with _lock_for(designation):
+        bundle = _bundles.get(designation) or _load_role_bundle(designation)
+        if bundle is None:
+            build_in_background(designation, embeddings)
+            return None
+
+        now = time.time()
+        if now - bundle["verified_at"] > ROLE_BUNDLE_CHECK_INTERVAL:
+            if not _still_valid(bundle):
+                _bundles.pop(designation, None)
+                build_in_background(designation, embeddings)
+                return None
+            bundle["verified_at"] = now
+        # Still correct, just old or without all vectors: serve it meanwhile
+        if now - bundle["built_at"] > ROLE_BUNDLE_TTL or \
+                (embeddings is not None and len(bundle["vectors"]) < len(bundle["schemas"])):
+            build_in_background(designation, embeddings)
+        _bundles[designation] = bundle
+        return bundle
+
+def invalidate_role_bundle(designation: str = None):
+    """Re-verify one designation's bundle, or every bundle, on next use."""
+    global _invalidations
+    with _registry_lock:
+        _invalidations += 1
+        bundles = list(_bundles.values())
+    for bundle in bundles:
+        if designation is None or bundle["designation"] == designation:
+            bundle["verified_at"] = 0
+
+def build_all_role_bundles(embeddings=None) -> list:
+    """Precompute and save a bundle for every role_name in role_privileges."""
+    with get_engine(PRIVILEGES_DB_NAME).connect() as conn:
+        roles = [row[0] for row in conn.execute(ROLES_QUERY)]
+    for designation in roles:
+        with _lock_for(designation):
+            bundle = build_role_bundle(designation, embeddings)
+            save_role_bundle(bundle)
+            _bundles[designation] = bundle
+    return roles
+
+def search_role_bundle(bundle: dict, vector, k: int) -> dict:
+    """Top-k readable tables by DDL similarity to `vector`, as {table: DDL}."""
+    tables = list(bundle["vectors"])
+    if not tables:
+        return {}
+    matrix = np.vstack([bundle["vectors"][t] for t in tables])
+    query = np.asarray(vector, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    scores = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+    return {tables[i]: bundle["schemas"][tables[i]] for i in np.argsort(-scores)[:k]}
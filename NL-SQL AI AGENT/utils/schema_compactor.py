@@ -0,0 +1,252 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import difflib
+import re
+from sqlalchemy import text
+from utils.cache import TTLCache
+from utils.db import get_engine, get_schema_cache
+from utils.formatting import format_value
+from utils.schema_index import tokenize
+from config.settings import (
+    SCHEMA_CACHE_TTL,
+    SCHEMA_PROMPT_TOKEN_BUDGET,
+    SCHEMA_MIN_COLUMNS_PER_TABLE,
+    SCHEMA_SAMPLE_ROWS,
+)
+
+# Builds the schema part of the SQL-generation prompt: compact DDL holding
+# the columns most relevant to the question, the keys needed to join the
+# selected tables, and sample rows only when the question names literal
+# values. Output is kept under a token budget (estimated at 4 chars/token).
+# Catalog entries and sample rows are cached per table under its catalog
+# fingerprint (SchemaCache.current_fingerprints), so a schema change is picked
+# up within SCHEMA_FINGERPRINT_INTERVAL and no question re-reads either.
+
+COLUMNS_QUERY = text("""
+SELECT
+    c.relname AS table_name,
+    a.attname AS column_name,
+    format_type(a.atttypid, a.atttypmod) AS data_type,
+    a.attnotnull AS not_null,
+    col_description(c.oid, a.attnum) AS column_comment,
+    EXISTS (
+        SELECT 1 FROM pg_constraint p
+        WHERE p.conrelid = c.oid AND p.contype = 'p' AND a.attnum = ANY(p.conkey)
+    ) AS is_primary_key
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid
+WHERE c.relname = ANY(:table_list)
+AND n.nspname = current_schema()
+AND a.attnum > 0
+AND NOT a.attisdropped
+ORDER BY c.relname, a.attnum
+""")
+
+# Single-column and composite foreign keys, one row per column pair
+FOREIGN_KEYS_QUERY = text("""
+SELECT
+    src.relname AS table_name,
+    src_col.attname AS column_name,
+    dst.relname AS ref_table,
+    dst_col.attname AS ref_column
+FROM pg_constraint fk
+JOIN pg_class src ON src.oid = fk.conrelid
+JOIN pg_class dst ON dst.oid = fk.confrelid
+JOIN pg_namespace n ON n.oid = src.relnamespace
+CROSS JOIN LATERAL unnest(fk.conkey, fk.confkey) AS k(src_attnum, dst_attnum)
+JOIN pg_attribute src_col ON src_col.attrelid = src.oid AND src_col.attnum = k.src_attnum
+JOIN pg_attribute dst_col ON dst_col.attrelid = dst.oid AND dst_col.attnum = k.dst_attnum
+WHERE fk.contype = 'f'
+AND n.nspname = current_schema()
+AND (src.relname = ANY(:table_list) OR dst.relname = ANY(:table_list))
+""")
+
+_catalog_cache = TTLCache(maxsize=2048, ttl=SCHEMA_CACHE_TTL)
+_sample_cache = TTLCache(maxsize=2048, ttl=SCHEMA_CACHE_TTL)
+
+def _fingerprints(db_name: str, tables: list) -> dict:
+    try:
+        return get_schema_cache(db_name).current_fingerprints(tables)
+    except Exception as e:
+        # Fall back to TTL-only expiry if the catalog can't be read
+        print(f"Schema fingerprint check failed: {e}")
+        return {t: None for t in tables}
+
+def estimate_tokens(value: str) -> int:
+    return (len(value) + 3) // 4
+
+def load_catalog(db_name: str, tables: list) -> dict:
+    """table -> {"columns": [...], "foreign_keys": [...]}, cached per table and fingerprint."""
+    fingerprints = _fingerprints(db_name, tables)
+    catalog = {t: _catalog_cache.get((db_name, t, fingerprints[t])) for t in tables}
+    missing = [t for t, entry in catalog.items() if entry is None]
+    if missing:
+        fetched = {t: {"columns": [], "foreign_keys": []} for t in missing}
+        with get_engine(db_name).connect() as conn:
+            for table, column, data_type, not_null, comment, is_pk in conn.execute(
+                    COLUMNS_QUERY, {"table_list": missing}):
+                fetched[table]["columns"].append({
+                    "name": column,
+                    "type": data_type,
+                    "not_null": not_null,
+                    "comment": comment,
+                    "primary_key": is_pk,
+                })
+            for table, column, ref_table, ref_column in conn.execute(
+                    FOREIGN_KEYS_QUERY, {"table_list": missing}):
+                edge = (table, column, ref_table, ref_column)
+                for end in (table, ref_table):
+                    if end in fetched and edge not in fetched[end]["foreign_keys"]:
+                        fetched[end]["foreign_keys"].append(edge)
+        for table, entry in fetched.items():
+            # Unknown tables come back without columns; don't cache those
+            if entry["columns"]:
+                _catalog_cache.set((db_name, table, fingerprints[table]), entry)
+        catalog.update(fetched)
+    return {t: entry for t, entry in catalog.items() if entry["columns"]}
+
+def invalidate_catalog(db_name: str = None, table: str = None):
+    def matches(key):
+        return (db_name is None or key[0] == db_name) and (table is None or key[1] == table)
+    _catalog_cache.invalidate(matches)
+    _sample_cache.invalidate(matches)
+
+def _column_score(question_tokens: set, question: str, column: dict) -> float:
+    tokens = set(tokenize(column["name"])) | set(tokenize(column["comment"] or ""))
+    score = float(len(tokens & question_tokens))
+    # Fuzzy match catches "qty" vs "quantity", "desc" vs "description"
+    for token in tokenize(column["name"]):
+        for word in question_tokens:
+            if token != word and difflib.SequenceMatcher(None, token, word).ratio() >= 0.8:
+                score += 0.5
+                break
+    if column["name"].lower() in question.lower():
+        score += 1.0
+    return score
+
+def _join_edges(catalog: dict, tables: list) -> list:
+    """Foreign keys whose both ends are among `tables`."""
+    selected = set(tables)
+    edges = []
+    for table in tables:
+        for edge in catalog[table]["foreign_keys"]:
+            if edge[0] in selected and edge[2] in selected and edge not in edges:
+                edges.append(edge)
+    return edges
+
+def _needs_samples(question: str) -> bool:
+    # Quoted values, or capitalized words past the first, usually name a
+    # value whose exact spelling/casing the model can only learn from samples
+    if re.search(r"['\"][^'\"]+['\"]", question):
+        return True
+    words = question.split()[1:]
+    return any(w[:1].isupper() and not w.isupper() for w in words)
+
+def _sample_rows(db_name: str, table: str, columns: list) -> list:
+    key = (db_name, table, _fingerprints(db_name, [table])[table], tuple(columns))
+    rows = _sample_cache.get(key)
+    if rows is None:
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        with get_engine(db_name).connect() as conn:
+            result = conn.execute(text(f'SELECT {column_list} FROM "{table}" LIMIT {int(SCHEMA_SAMPLE_ROWS)}'))
+            rows = [list(row) for row in result]
+        _sample_cache.set(key, rows)
+    return rows
+
+def _render_table(table: str, columns: list, omitted: int, foreign_keys: dict) -> str:
+    lines = []
+    for column in columns:
+        line = f"    {column['name']} {column['type']}"
+        if column["primary_key"]:
+            line += " PRIMARY KEY"
+        elif column["not_null"]:
+            line += " NOT NULL"
+        if column["name"] in foreign_keys:
+            ref_table, ref_column = foreign_keys[column["name"]]
+            line += f" REFERENCES {ref_table}({ref_column})"
+        if column["comment"]:
+            line += f" -- {column['comment']}"
+        lines.append(line)
+    ddl = f"CREATE TABLE {table} (\n" + ",\n".join(lines) + "\n)"
+    if omitted:
+        ddl += f"\n-- {omitted} more column{'s' if omitted != 1 else ''} omitted"
+    return ddl
+
+def compact_schema(db_name: str, question: str, tables: list, optional_tables: list = (),
+                   token_budget: int = SCHEMA_PROMPT_TOKEN_BUDGET, include_samples: bool = None,
+                   catalog: dict = None) -> str:
+    """Compact DDL for `tables`, plus `optional_tables` while the budget allows.
+
+    Every table keeps its primary key, the foreign keys joining it to the other
+    selected tables and its SCHEMA_MIN_COLUMNS_PER_TABLE best columns; the rest
+    of the budget goes to the remaining columns in order of relevance.
+    `catalog` is a load_catalog result to use instead of querying the database.
+    """
+    ordered = list(dict.fromkeys(list(tables) + [t for t in optional_tables if t not in tables]))
+    catalog = load_catalog(db_name, ordered) if catalog is None else catalog
+    ordered = [t for t in ordered if t in catalog]
+    if not ordered:
+        return ""
+
+    question_tokens = set(tokenize(question))
+    join_edges = _join_edges(catalog, ordered)
+    join_columns = {(e[0], e[1]) for e in join_edges} | {(e[2], e[3]) for e in join_edges}
+
+    chosen, candidates = {}, []
+    used = 0
+    for table in ordered:
+        scored = [
+            (_column_score(question_tokens, question, c), position, c)
+            for position, c in enumerate(catalog[table]["columns"])
+        ]
+        required = [s for s in scored if s[2]["primary_key"] or (table, s[2]["name"]) in join_columns]
+        rest = sorted((s for s in scored if s not in required), key=lambda s: (-s[0], s[1]))
+        required += rest[:max(0, SCHEMA_MIN_COLUMNS_PER_TABLE - len(required))]
+        cost = estimate_tokens(table) + 4 + sum(estimate_tokens(f"{s[2]['name']} {s[2]['type']}") + 2 for s in required)
+        if table not in tables and used + cost > token_budget:
+            continue
+        chosen[table] = required
+        used += cost
+        candidates += [(table, s) for s in rest if s not in required]
+
+    # Spend what's left on the most relevant remaining columns
+    for table, s in sorted(candidates, key=lambda item: -item[1][0]):
+        cost = estimate_tokens(f"{s[2]['name']} {s[2]['type']} {s[2]['comment'] or ''}") + 2
+        if used + cost > token_budget:
+            continue
+        chosen[table].append(s)
+        used += cost
+
+    selected = list(chosen)
+    edges = [e for e in join_edges if e[0] in chosen and e[2] in chosen]
+    if include_samples is None:
+        include_samples = SCHEMA_SAMPLE_ROWS > 0 and _needs_samples(question)
+
+    parts = []
+    for table in selected:
+        columns = [s[2] for s in sorted(chosen[table], key=lambda s: s[1])]
+        foreign_keys = {e[1]: (e[2], e[3]) for e in edges if e[0] == table}
+        parts.append(_render_table(table, columns, len(catalog[table]["columns"]) - len(columns), foreign_keys))
+
+    if edges:
+        parts.append("-- Join paths:\n" + "\n".join(f"-- {a}.{b} = {c}.{d}" for a, b, c, d in edges))
+
+    schema = "\n\n".join(parts)
+    if include_samples:
+        used = estimate_tokens(schema)
+        for table in selected:
+            names = [s[2]["name"] for s in sorted(chosen[table], key=lambda s: s[1])]
+            try:
+                rows = _sample_rows(db_name, table, names)
+            except Exception as e:
+                print(f"Sample rows for {table} failed: {e}")
+                continue
+            block = f"/* {SCHEMA_SAMPLE_ROWS} rows from {table}:\n" + "\t".join(names) + "\n" + \
+                "\n".join("\t".join(format_value(v)[:40] for v in row) for row in rows) + "\n*/"
+            if used + estimate_tokens(block) > token_budget:
+                break
+            schema += "\n\n" + block
+            used += estimate_tokens(block)
+    return schema
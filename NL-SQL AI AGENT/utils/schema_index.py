@@ -0,0 +1,254 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import math
+import re
+import threading
+import time
+from collections import Counter
+import numpy as np
+from sqlalchemy import text
+from utils.db import get_engine
+from config.settings import (
+    TABLE_SYNONYMS,
+    TABLE_RESOLVER_REFRESH_INTERVAL,
+    TABLE_RESOLVER_MAX_TABLES,
+    TABLE_RESOLVER_RELATIVE_CUTOFF,
+    TABLE_RESOLVER_EMBEDDING_WEIGHT,
+)
+
+# Resolves a question to candidate tables from the catalog alone: BM25 over
+# table/column names, comments and configured synonyms, optionally blended
+# with cosine similarity between the question and per-table embeddings.
+
+# Every table with its column names and comments, in one catalog round trip
+CATALOG_QUERY = text("""
+SELECT
+    c.relname AS table_name,
+    obj_description(c.oid, 'pg_class') AS table_comment,
+    a.attname AS column_name,
+    col_description(c.oid, a.attnum) AS column_comment
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid
+WHERE c.relkind IN ('r', 'p', 'v', 'm')
+AND n.nspname = current_schema()
+AND a.attnum > 0
+AND NOT a.attisdropped
+ORDER BY c.relname, a.attnum
+""")
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "from", "by", "with", "and", "or",
+    "is", "are", "was", "were", "be", "me", "my", "our", "we", "i", "you", "it", "its",
+    "all", "any", "each", "every", "what", "which", "who", "whom", "whose", "how", "many",
+    "much", "show", "list", "give", "get", "find", "tell", "display", "please", "can",
+    "could", "would", "do", "does", "did", "there", "that", "this", "these", "those",
+    "than", "at", "as", "per", "id", "ids", "table", "tables", "data", "details",
+}
+
+def tokenize(value: str) -> list:
+    """Lowercase word tokens with identifiers split on underscores and a light plural stem."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", (value or "").lower().replace("_", " ")):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+# Write verbs only count at the start of a request ("add a supplier ...");
+# anywhere else they are usually nouns or adjectives ("new orders", "price change").
+_OPERATION_PATTERNS = [
+    ("DELETE", re.compile(r"\b(delete|remove|purge|erase)\b")),
+    ("UPDATE", re.compile(r"\b(update|modify|change|set|edit|increase|decrease|rename|mark)\b")),
+    ("INSERT", re.compile(r"\b(insert|add|create|register|record)\b")),
+]
+_REQUEST_PREFIX = re.compile(r"^\s*(?:please\s+|(?:can|could|would|will)\s+you\s+(?:please\s+)?)?(\w+)")
+
+def detect_operation(question: str) -> str:
+    """SQL verb for the question; anything that doesn't start with a write verb is a SELECT."""
+    match = _REQUEST_PREFIX.match((question or "").lower())
+    if match:
+        for operation, pattern in _OPERATION_PATTERNS:
+            if pattern.fullmatch(match.group(1)):
+                return operation
+    return "SELECT"
+
+
+class SchemaIndex:
+    """In-memory table resolver for one database.
+
+    The catalog is re-read at most every `refresh_interval` seconds, in a
+    background thread that swaps the rebuilt index in when done; requests keep
+    using the previous index meanwhile. Table embeddings are only recomputed
+    for tables whose indexed text changed.
+    """
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, db_name: str, embeddings=None,
+                 refresh_interval: float = TABLE_RESOLVER_REFRESH_INTERVAL):
+        self._db_name = db_name
+        self._embeddings = embeddings
+        self._refresh_interval = refresh_interval
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()          # guards the index fields and _refreshing
+        self._build_lock = threading.Lock()    # serializes foreground (first or forced) loads
+        self._refreshing = False
+        self.tables = []
+        self._documents = {}     # table -> indexed text
+        self._term_counts = []   # per table, Counter of tokens
+        self._lengths = []
+        self._avg_length = 0.0
+        self._idf = {}
+        self._vectors = {}       # table -> (indexed text, unit vector)
+        self._matrix = None
+
+    def _load_catalog(self) -> dict:
+        tables = {}
+        with get_engine(self._db_name).connect() as conn:
+            for table, table_comment, column, column_comment in conn.execute(CATALOG_QUERY):
+                parts = tables.setdefault(table, [table, table, table_comment or ""])
+                parts += [column, column_comment or ""]
+        for table, synonyms in TABLE_SYNONYMS.items():
+            if table in tables:
+                tables[table] += list(synonyms) * 2
+        # Table names are repeated so they outweigh a matching column name
+        return {table: " ".join(parts) for table, parts in tables.items()}
+
+    def _embed_tables(self, documents: dict) -> tuple:
+        """(vectors, matrix) for `documents`, re-embedding only the changed tables."""
+        vectors = {t: self._vectors[t] for t, doc in documents.items() if self._vectors.get(t, (None,))[0] == doc}
+        changed = [t for t in documents if t not in vectors]
+        if changed:
+            embedded = self._embeddings.embed_documents([documents[t] for t in changed])
+            for table, vector in zip(changed, embedded):
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vectors[table] = (documents[table], vector / norm if norm else vector)
+        matrix = np.vstack([vectors[t][1] for t in documents]) if documents else None
+        return vectors, matrix
+
+    def _rebuild(self):
+        """Read the catalog and build a new index off the lock, then swap it in."""
+        documents = self._load_catalog()
+        term_counts = [Counter(tokenize(doc)) for doc in documents.values()]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        doc_freq = Counter(term for counts in term_counts for term in counts)
+        n = len(documents)
+
+        vectors, matrix = {}, None
+        if self._embeddings is not None:
+            try:
+                vectors, matrix = self._embed_tables(documents)
+            except Exception as e:
+                # Lexical scores alone still work
+                print(f"Table embedding failed: {e}")
+
+        with self._lock:
+            self.tables = list(documents)
+            self._documents = documents
+            self._term_counts = term_counts
+            self._lengths = lengths
+            self._avg_length = (sum(lengths) / n) if n else 0.0
+            self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+            self._vectors = vectors
+            self._matrix = matrix
+            self._loaded_at = time.time()
+
+    def _background_refresh(self):
+        try:
+            self._rebuild()
+        except Exception as e:
+            # Keep serving the stale index; the next request retries
+            print(f"Schema index refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh(self, force: bool = False):
+        """Load the index on first use (or when forced); later refreshes run in
+        the background while requests keep using the current index."""
+        with self._lock:
+            if not force and time.time() - self._loaded_at < self._refresh_interval:
+                return
+            if self._loaded_at and not force:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._background_refresh, name="schema-index-refresh", daemon=True).start()
+                return
+        with self._build_lock:
+            # Another caller may have finished the first load while we waited
+            if force or not self._loaded_at:
+                self._rebuild()
+
+    def _snapshot(self) -> tuple:
+        with self._lock:
+            return self.tables, self._term_counts, self._lengths, self._avg_length, self._idf, self._matrix
+
+    def _bm25(self, query_terms: list, term_counts, lengths, avg_length, idf) -> np.ndarray:
+        scores = np.zeros(len(term_counts), dtype=np.float32)
+        for i, counts in enumerate(term_counts):
+            norm = self.k1 * (1 - self.b + self.b * lengths[i] / (avg_length or 1))
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    scores[i] += idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def resolve(self, question: str, vector=None) -> tuple:
+        """Return (tables, confidence) for the question.
+
+        `confidence` is the best raw BM25 score: zero means no table or column
+        term appeared in the question, so the result is an embedding guess at best.
+        `vector` is the question embedding, when the caller already has one.
+        """
+        self.refresh()
+        tables, term_counts, lengths, avg_length, idf, matrix = self._snapshot()
+        if not tables:
+            return [], 0.0
+
+        lexical = self._bm25(tokenize(question), term_counts, lengths, avg_length, idf)
+        confidence = float(lexical.max())
+        scores = lexical / confidence if confidence else lexical
+
+        if vector is not None and matrix is not None:
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            similarity = matrix @ (query / norm if norm else query)
+            spread = similarity.max() - similarity.min()
+            if spread > 0:
+                similarity = (similarity - similarity.min()) / spread
+                scores = (1 - TABLE_RESOLVER_EMBEDDING_WEIGHT) * scores + TABLE_RESOLVER_EMBEDDING_WEIGHT * similarity
+
+        order = np.argsort(-scores)
+        best = scores[order[0]]
+        if best <= 0:
+            return [], confidence
+        return [
+            tables[i] for i in order[:TABLE_RESOLVER_MAX_TABLES]
+            if scores[i] >= TABLE_RESOLVER_RELATIVE_CUTOFF * best and lexical[i] > 0
+        ], confidence
+
+    def known(self, tables: list) -> list:
+        """The subset of `tables` that exist, matched case-insensitively."""
+        self.refresh()
+        by_lower = {t.lower(): t for t in self.tables}
+        return [by_lower[t.lower()] for t in tables if isinstance(t, str) and t.lower() in by_lower]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_schema_index(db_name: str, embeddings=None) -> SchemaIndex:
+    with _indexes_lock:
+        index = _indexes.get(db_name)
+        if index is None:
+            index = _indexes[db_name] = SchemaIndex(db_name, embeddings)
+        return index
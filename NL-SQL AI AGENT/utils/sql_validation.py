@@ -0,0 +1,167 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import re
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from utils.cache import TTLCache
+from config.settings import SQL_ALLOWED_SCHEMA
+
+# Parse-tree checks for generated SQL. parse_sql results are cached by the
+# exact statement text, so the validator, the cost guard and the result cache
+# all share one parse per query.
+
+_parsed = TTLCache(maxsize=1024, ttl=3600)
+
+_CODE_BLOCK_PATTERN = re.compile(r"```(?:sql|postgresql)?\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+_STATEMENT_START_PATTERN = re.compile(r"\b(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+_WRITE_NODES = (exp.Insert, exp.Update, exp.Delete, exp.Merge)
+
+
+class SQLValidationError(ValueError):
+    pass
+
+
+def extract_sql_text(text: str) -> str:
+    """Statement text from an LLM reply: a fenced block, else the first SQL verb up to `;`."""
+    if not text:
+        return None
+    match = _CODE_BLOCK_PATTERN.search(text)
+    if match:
+        return match.group(1).strip()
+    match = _STATEMENT_START_PATTERN.search(text)
+    if match:
+        statement = text[match.start():]
+        end = statement.find(";")
+        return (statement if end == -1 else statement[:end + 1]).strip()
+    return None
+
+
+def _statement_type(ast) -> str:
+    if isinstance(ast, (exp.Select, exp.Union, exp.Intersect, exp.Except)):
+        # Data-modifying CTEs (WITH d AS (DELETE ... RETURNING *) SELECT ...) write too
+        return "WRITE" if ast.find(*_WRITE_NODES) else "SELECT"
+    for node_type, name in ((exp.Insert, "INSERT"), (exp.Update, "UPDATE"), (exp.Delete, "DELETE")):
+        if isinstance(ast, node_type):
+            return name
+    return "OTHER"
+
+
+def _identifier(node) -> str:
+    # Unquoted identifiers fold to lower case in PostgreSQL
+    return node.name if node.args.get("quoted") else node.name.lower()
+
+
+def _visible_ctes(table) -> set:
+    """Names of the CTEs an unqualified reference at `table` can bind to.
+
+    Walking up from the reference, each enclosing query's WITH clause is in
+    scope; inside a CTE body only the CTEs defined before it are (plus
+    itself when the WITH is RECURSIVE).
+    """
+    names = set()
+    child, node = table, table.parent
+    while node is not None:
+        if isinstance(node, exp.With):
+            for cte in node.expressions:
+                if cte is child:
+                    if node.args.get("recursive"):
+                        names.add(_identifier(cte.args["alias"].this))
+                    break
+                names.add(_identifier(cte.args["alias"].this))
+        else:
+            with_ = next((v for v in node.args.values() if isinstance(v, exp.With)), None)
+            if with_ is not None and with_ is not child:
+                names.update(_identifier(cte.args["alias"].this) for cte in with_.expressions)
+        child, node = node, node.parent
+    return names
+
+
+def _table_references(ast):
+    """(tables, schemas): real tables referenced, and the qualifiers used on them."""
+    tables, schemas = [], set()
+    for table in ast.find_all(exp.Table):
+        if not isinstance(table.this, exp.Identifier):
+            # Table functions such as unnest(...) or generate_series(...)
+            continue
+        name = _identifier(table.this)
+        qualifier = ".".join(_identifier(part) for part in (table.args.get("catalog"), table.args.get("db")) if part)
+        if not qualifier and name in _visible_ctes(table):
+            continue
+        if qualifier:
+            schemas.add(qualifier)
+        if name not in tables:
+            tables.append(name)
+    return tables, schemas
+
+
+def parse_sql(sql: str) -> dict:
+    """Parse one PostgreSQL statement.
+
+    Returns {"ast", "statement_type", "tables", "schemas", "columns", "normalized"}.
+    `tables` holds every referenced table except references bound to a CTE,
+    `schemas` the qualifiers written on them; `normalized` is the canonical
+    rendering used for cache keys. Raises SQLValidationError if the text is not exactly one
+    parseable statement.
+    """
+    parsed = _parsed.get(sql)
+    if parsed is not None:
+        return parsed
+
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
+    except ParseError as e:
+        raise SQLValidationError(f"Could not parse SQL: {e}") from e
+    if len(statements) != 1:
+        raise SQLValidationError(f"Expected one SQL statement, got {len(statements)}")
+    ast = statements[0]
+
+    tables, schemas = _table_references(ast)
+    columns = sorted({column.name.lower() for column in ast.find_all(exp.Column) if column.name})
+
+    parsed = {
+        "ast": ast,
+        "statement_type": _statement_type(ast),
+        "tables": tables,
+        "schemas": sorted(schemas),
+        "columns": columns,
+        "normalized": ast.sql(dialect="postgres", normalize=True),
+    }
+    _parsed.set(sql, parsed)
+    return parsed
+
+
+def validate_sql(sql: str, allowed_tables: list, writable_tables: list = ()) -> dict:
+    """Parse `sql` and enforce table access; returns the parse_sql result.
+
+    Every referenced table must be in `allowed_tables` and, if qualified, in
+    SQL_ALLOWED_SCHEMA. Anything but a plain SELECT additionally needs all
+    its tables in `writable_tables`. Row-locking clauses are never allowed.
+    """
+    parsed = parse_sql(sql)
+
+    if parsed["ast"].find(exp.Lock):
+        raise SQLValidationError("Row-locking clauses (FOR UPDATE/FOR SHARE) are not allowed")
+
+    other_schemas = [s for s in parsed["schemas"] if s != SQL_ALLOWED_SCHEMA.lower()]
+    if other_schemas:
+        raise SQLValidationError(f"Generated SQL uses tables outside the {SQL_ALLOWED_SCHEMA} schema: {', '.join(other_schemas)}")
+
+    # Names are compared as PostgreSQL resolves them: unquoted ones were
+    # folded to lower case by parse_sql, quoted ones keep their case
+    allowed = set(allowed_tables)
+    forbidden = [t for t in parsed["tables"] if t not in allowed]
+    if forbidden:
+        raise SQLValidationError(f"Generated SQL uses tables outside the allowed set: {', '.join(forbidden)}")
+    if not parsed["tables"]:
+        raise SQLValidationError("Generated SQL does not reference any allowed table")
+
+    if parsed["statement_type"] != "SELECT":
+        writable = set(writable_tables)
+        if parsed["statement_type"] == "OTHER" or any(t not in writable for t in parsed["tables"]):
+            raise SQLValidationError(
+                f"{parsed['statement_type']} statements are not allowed for this role; only SELECT queries can run"
+            )
+    return parsed
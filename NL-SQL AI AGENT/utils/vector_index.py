@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import time
+from typing import List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+# Small on-disk vector index for the schema catalogue: a float32 matrix of
+# unit vectors (vectors.npy, memory-mapped on load) next to a JSON docstore
+# with one {"page_content", "metadata"} entry per row. A few hundred tables
+# load in milliseconds and search is a single matrix-vector product.
+#
+# Each save writes a new version directory; the CURRENT file names the live
+# one and is swapped in with a single os.replace.
+
+VECTORS_FILE = "vectors.npy"
+DOCSTORE_FILE = "docstore.json"
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2       # the live version plus the one before it, for readers still mapping it
+
+
+class LocalVectorIndex:
+    def __init__(self, path: str, matrix=None, docstore=None):
+        self.path = path
+        self.matrix = matrix
+        self.docstore = docstore or []
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        """Open the index in `path`; an empty index if nothing was saved there yet."""
+        try:
+            with open(os.path.join(path, CURRENT_FILE), encoding="utf-8") as f:
+                version = os.path.join(path, f.read().strip())
+        except FileNotFoundError:
+            return cls(path)
+        with open(os.path.join(version, DOCSTORE_FILE), encoding="utf-8") as f:
+            docstore = json.load(f)
+        matrix = np.load(os.path.join(version, VECTORS_FILE), mmap_mode="r") if docstore else None
+        return cls(path, matrix, docstore)
+
+    def __len__(self):
+        return len(self.docstore)
+
+    def vector(self, i: int) -> np.ndarray:
+        return np.asarray(self.matrix[i])
+
+    def save(self, docstore: list, vectors: list):
+        """Replace the saved index. Both files go into a new version directory
+        and CURRENT is repointed in one os.replace, so a reader never sees
+        vectors and docstore from different versions."""
+        os.makedirs(self.path, exist_ok=True)
+        matrix = np.vstack([_normalize(v) for v in vectors]) if vectors else np.zeros((0, 0), dtype=np.float32)
+        version = f"v{time.time_ns()}"
+        version_tmp = os.path.join(self.path, version + ".tmp")
+        os.makedirs(version_tmp)
+        with open(os.path.join(version_tmp, VECTORS_FILE), "wb") as f:
+            np.save(f, matrix)
+        with open(os.path.join(version_tmp, DOCSTORE_FILE), "w", encoding="utf-8") as f:
+            json.dump(docstore, f)
+        os.rename(version_tmp, os.path.join(self.path, version))
+
+        current_tmp = os.path.join(self.path, CURRENT_FILE + ".tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(current_tmp, os.path.join(self.path, CURRENT_FILE))
+        self.matrix, self.docstore = matrix, docstore
+        self._prune(version)
+
+    def _prune(self, current: str):
+        versions = sorted(
+            (d for d in os.listdir(self.path) if d.startswith("v") and d[1:].isdigit()),
+            key=lambda d: int(d[1:])
+        )
+        for d in versions[:-KEEP_VERSIONS]:
+            if d != current:
+                shutil.rmtree(os.path.join(self.path, d), ignore_errors=True)
+
+    def search(self, vector, k: int = 4) -> list:
+        """Top-k (document, cosine similarity) pairs."""
+        if not self.docstore:
+            return []
+        scores = self.matrix @ _normalize(vector)
+        top = np.argsort(-scores)[:k]
+        return [
+            (Document(page_content=self.docstore[i]["page_content"], metadata=self.docstore[i]["metadata"]), float(scores[i]))
+            for i in top
+        ]
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class LocalSchemaRetriever(BaseRetriever):
+    """Retriever over a LocalVectorIndex; a drop-in for the Qdrant retriever."""
+
+    index: LocalVectorIndex
+    embeddings: Embeddings
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.index.search(self.embeddings.embed_query(query), self.k)]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        return [doc for doc, _ in self.index.search(await self.embeddings.aembed_query(query), self.k)]
@@ -6,8 +6,8 @@ from flask import Flask, render_template, request, jsonify
 
 # Import functions from your services modules
 # Make sure these paths are correct relative to app.py
-from services.llm_service import extract_triplets, extract_entities_from_question, get_rag_response
-from services.neo4j_handler import neo4j_driver, insert_triplet_to_neo4j, query_neo4j_for_facts
+from services.llm_service import extract_triplets_concurrently, extract_entities_from_question, get_rag_response
+from services.neo4j_handler import neo4j_driver, ensure_schema, get_schema_state, insert_triplets_to_neo4j, query_neo4j_for_facts
 from services.pdf_processor import extract_text_from_pdfs, chunk_text
 
 # Load environment variables from .env file
@@ -17,11 +17,16 @@ load_dotenv()
 app = Flask(__name__)
 # No app.secret_key needed as Flask session is not used for state management
 
+# Create Neo4j constraints/indexes (idempotent) and wait for them before any ingestion
+if neo4j_driver:
+    ensure_schema(neo4j_driver)
+
 # --- Global In-memory Storage (Volatile: resets on server restart) ---
 # For demonstration/debugging without Flask session or a full database.
 # In a production multi-user app, you'd use a database for persistent state.
 temp_extracted_triplets = [] # Stores triplets after PDF processing, before Neo4j insertion
 temp_uploaded_files_info = [] # Stores names of uploaded files for display
+upload_progress = {"total_chunks": 0, "processed_chunks": 0} # Triplet extraction progress, polled via /upload_progress
 
 # --- Flask Routes ---
 
@@ -43,6 +48,10 @@ def upload_pdf():
     """
     global temp_extracted_triplets
     global temp_uploaded_files_info
+    global upload_progress
+
+    # Reset before parsing so the UI never shows the previous upload's N/N
+    upload_progress = {"total_chunks": 0, "processed_chunks": 0}
 
     if 'pdf_files' not in request.files:
         return jsonify({"status": "error", "message": "No file part"}), 400
@@ -60,27 +69,54 @@ def upload_pdf():
         chunks = chunk_text(raw_text)
         print(f"DEBUG (app.py): Extracted {len(chunks)} text chunks from PDF(s).")
         
-        all_triplets = []
-        for i, chunk in enumerate(chunks):
-            # Call LLM service to extract triplets from each chunk
-            triplets = extract_triplets(chunk)
-            all_triplets.extend(triplets)
-            print(f"DEBUG (app.py): Processed chunk {i+1}/{len(chunks)}, extracted {len(triplets)} triplets from this chunk.")
+        upload_progress = {"total_chunks": len(chunks), "processed_chunks": 0}
+
+        def report_progress(done, total):
+            upload_progress["processed_chunks"] = done
+            print(f"DEBUG (app.py): Processed chunk {done}/{total}.")
+
+        # Call LLM service to extract triplets from all chunks concurrently (results keep chunk order)
+        chunk_triplets, failed_chunks = extract_triplets_concurrently(chunks, progress_callback=report_progress)
+        all_triplets = [t for triplets in chunk_triplets for t in triplets]
         
         # Store all extracted triplets in global memory for graph generation step
         temp_extracted_triplets = all_triplets
         print(f"DEBUG (app.py): Total {len(all_triplets)} potential triplets extracted across all chunks.")
         
+        message = f"Document(s) '{', '.join(uploaded_file_names)}' uploaded and {len(all_triplets)} entities/triplets extracted."
+        if failed_chunks:
+            print(f"DEBUG (app.py): Triplet extraction failed for chunks {failed_chunks}.")
+            message += f" Extraction failed for {len(failed_chunks)} of {len(chunks)} chunks; that part of the document is missing."
         return jsonify({
             "status": "success",
-            "message": f"Document(s) '{', '.join(uploaded_file_names)}' uploaded and {len(all_triplets)} entities/triplets extracted.",
+            "message": message,
             "entities_count": len(all_triplets),
+            "failed_chunks": len(failed_chunks),
+            "failed_chunk_indices": failed_chunks,
             "uploaded_files": temp_uploaded_files_info # Send updated file list back to frontend
         })
     except Exception as e:
         print(f"DEBUG (app.py): Error during PDF processing: {e}")
         return jsonify({"status": "error", "message": f"Error processing PDF: {str(e)}"}), 500
 
+@app.route('/upload_progress', methods=['GET'])
+def get_upload_progress():
+    """
+    Returns how many chunks of the current upload have been processed so far.
+    """
+    return jsonify(upload_progress)
+
+@app.route('/graph_schema', methods=['GET'])
+def graph_schema():
+    """
+    Returns the Neo4j constraints and indexes with their state (e.g. ONLINE, POPULATING).
+    """
+    try:
+        return jsonify(get_schema_state(neo4j_driver))
+    except Exception as e:
+        print(f"DEBUG (app.py): Error reading Neo4j schema: {e}")
+        return jsonify({"status": "error", "message": f"Error reading graph schema: {str(e)}"}), 500
+
 @app.route('/generate_graph', methods=['POST'])
 def generate_graph():
     """
@@ -93,22 +129,14 @@ def generate_graph():
         return jsonify({"status": "warning", "message": "No triplets extracted to generate graph. Please upload PDFs first."})
 
     try:
-        inserted_count = 0
-        for i, t in enumerate(temp_extracted_triplets):
-            sub = str(t.get('subject', ''))
-            pred = str(t.get('predicate', ''))
-            obj = str(t.get('object', ''))
-            
-            if sub and pred and obj:
-                # Call Neo4j handler to insert triplet
-                insert_triplet_to_neo4j(neo4j_driver, sub, pred, obj)
-                inserted_count += 1
-            else:
-                print(f"DEBUG (app.py): Skipping malformed triplet: {t}")
+        # Call Neo4j handler to insert all triplets in batched UNWIND transactions
+        summary = insert_triplets_to_neo4j(neo4j_driver, temp_extracted_triplets)
+        total_seconds = sum(b["seconds"] for b in summary["batches"])
         
         # Clear temporary triplets after they have been inserted into Neo4j
         temp_extracted_triplets = []
-        print(f"DEBUG (app.py): Successfully inserted {inserted_count} triplets into Neo4j.")
+        print(f"DEBUG (app.py): Successfully inserted {summary['inserted']} triplets into Neo4j in "
+              f"{len(summary['batches'])} batches ({total_seconds:.2f}s), skipped {summary['skipped']} malformed.")
         return jsonify({"status": "success", "message": "Neo4j Graph Generated successfully!"})
     except Exception as e:
         print(f"DEBUG (app.py): Error generating graph in Neo4j: {e}")
@@ -137,7 +165,7 @@ def chat():
         graph_context = ""
         if identified_entities:
             # Call Neo4j handler to query for relevant facts
-            retrieved_facts = query_neo4j_for_facts(neo4j_driver, identified_entities)
+            retrieved_facts = query_neo4j_for_facts(neo4j_driver, identified_entities, identified_relationships)
             print(f"DEBUG (app.py): Retrieved Facts from Neo4j: {retrieved_facts}")
 
             if retrieved_facts:
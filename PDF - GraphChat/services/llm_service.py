@@ -1,5 +1,9 @@
 import os
 import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import openai
 from openai import OpenAI
 from dotenv import load_dotenv
 
@@ -19,11 +23,20 @@ client = OpenAI(
 GROQ_MODEL_GRAPH_EXTRACTION = "llama-3.3-70b-versatile" 
 GROQ_MODEL_RAG = "llama-3.3-70b-versatile"
 
-def extract_triplets(text_chunk):
-    """
-    Uses the LLM to extract subject-predicate-object triplets from a text chunk.
-    """
-    prompt_template_str = """
+# Concurrent triplet extraction (extract_triplets_concurrently)
+TRIPLET_EXTRACTION_CONCURRENCY = int(os.getenv("TRIPLET_EXTRACTION_CONCURRENCY", "8"))  # chunks in flight at once
+TRIPLET_EXTRACTION_MAX_RETRIES = int(os.getenv("TRIPLET_EXTRACTION_MAX_RETRIES", "4"))
+TRIPLET_EXTRACTION_BACKOFF_SECONDS = float(os.getenv("TRIPLET_EXTRACTION_BACKOFF_SECONDS", "1.0"))
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx
+TRANSIENT_LLM_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+TRIPLET_PROMPT_TEMPLATE = """
     You are an expert in extracting triplets from text.
     Your task is to extract all subject-predicate-object triplets from the provided text chunk.
     Each triplet should be represented as a JSON object with keys "subject", "predicate", and "object".
@@ -44,18 +57,12 @@ def extract_triplets(text_chunk):
     this makes sure that the triplets are consistent and can be used to build a knowledge graph and not too much noise is generated.
     this is important for the next step to work correctly.
     """
-    prompt = prompt_template_str.format(chunk=text_chunk)
 
-    content = ""
+def _parse_triplets(content):
+    """
+    Parses the LLM's JSON reply into a list of triplet dicts. Raises ValueError if it can't.
+    """
     try:
-        chat_completion = client.chat.completions.create(
-            model=GROQ_MODEL_GRAPH_EXTRACTION,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2, # Lower temperature for more deterministic triplet extraction
-            response_format={"type": "json_object"} # Request JSON output
-        )
-        content = chat_completion.choices[0].message.content
-        
         parsed_response = json.loads(content)
 
         # Handle cases where LLM might wrap the array in an object (e.g., {"triplets": [...]})
@@ -65,14 +72,84 @@ def extract_triplets(text_chunk):
             return parsed_response
         else:
             print(f"DEBUG (llm_service.py): LLM returned unexpected root format for triplets after JSON parse: {content}")
-            return []
+            raise ValueError("Unexpected triplet JSON format")
     except json.JSONDecodeError as e:
         print(f"DEBUG (llm_service.py): JSON parse error in extract_triplets: {e}. Raw content: {content[:200]}...")
-        return []
+        raise ValueError(f"Invalid triplet JSON: {e}") from e
+
+def _request_triplets(text_chunk, llm_client=client):
+    """
+    Sends one chunk to the LLM and returns the raw reply. API errors are raised.
+    """
+    chat_completion = llm_client.chat.completions.create(
+        model=GROQ_MODEL_GRAPH_EXTRACTION,
+        messages=[{"role": "user", "content": TRIPLET_PROMPT_TEMPLATE.format(chunk=text_chunk)}],
+        temperature=0.2, # Lower temperature for more deterministic triplet extraction
+        response_format={"type": "json_object"} # Request JSON output
+    )
+    return chat_completion.choices[0].message.content or ""
+
+def extract_triplets(text_chunk):
+    """
+    Uses the LLM to extract subject-predicate-object triplets from a text chunk.
+    """
+    try:
+        return _parse_triplets(_request_triplets(text_chunk))
     except Exception as e:
         print(f"DEBUG (llm_service.py): Error in extract_triplets: {e}")
         return []
 
+def _extract_triplets_with_retry(text_chunk, max_retries, backoff_seconds):
+    """
+    extract_triplets with exponential backoff (plus jitter) on transient API errors.
+    Returns None if the chunk failed, so callers can tell it apart from a chunk without triplets.
+    """
+    # Retries are handled here, so turn off the client's own
+    llm_client = client.with_options(max_retries=0)
+    for attempt in range(max_retries + 1):
+        try:
+            return _parse_triplets(_request_triplets(text_chunk, llm_client))
+        except TRANSIENT_LLM_ERRORS as e:
+            if attempt == max_retries:
+                print(f"DEBUG (llm_service.py): Giving up on chunk after {attempt + 1} attempts: {e}")
+                return None
+            delay = backoff_seconds * (2 ** attempt) + random.uniform(0, backoff_seconds)
+            print(f"DEBUG (llm_service.py): Transient error ({type(e).__name__}), retrying chunk in {delay:.1f}s")
+            time.sleep(delay)
+        except Exception as e:
+            print(f"DEBUG (llm_service.py): Error in extract_triplets: {e}")
+            return None
+
+def extract_triplets_concurrently(chunks, max_workers=TRIPLET_EXTRACTION_CONCURRENCY,
+                                  max_retries=TRIPLET_EXTRACTION_MAX_RETRIES,
+                                  backoff_seconds=TRIPLET_EXTRACTION_BACKOFF_SECONDS,
+                                  progress_callback=None):
+    """
+    Extracts triplets from all chunks with up to `max_workers` LLM requests in flight.
+    Returns (results, failed): one list of triplets per chunk, in chunk order, and the
+    indices of chunks that still failed after retries (their lists are empty).
+    `progress_callback(done, total)` is called after each chunk finishes.
+    """
+    results = [[] for _ in chunks]
+    failed = []
+    if not chunks:
+        return results, failed
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(_extract_triplets_with_retry, chunk, max_retries, backoff_seconds): i
+            for i, chunk in enumerate(chunks)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            triplets = future.result()
+            if triplets is None:
+                failed.append(futures[future])
+            else:
+                results[futures[future]] = triplets
+            if progress_callback:
+                progress_callback(done, len(chunks))
+    return results, sorted(failed)
+
 def extract_entities_from_question(question):
     """
     Uses the LLM to identify key entities and relationships from a user's question.
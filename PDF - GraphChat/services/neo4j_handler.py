@@ -1,4 +1,7 @@
+import math
 import os
+import re
+import time
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 
@@ -9,6 +12,63 @@ load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "12345678") # WARNING: Change this in production!
+NEO4J_WRITE_BATCH_SIZE = int(os.getenv("NEO4J_WRITE_BATCH_SIZE", "2000")) # Triplets per UNWIND transaction
+
+NEO4J_INDEX_WAIT_SECONDS = int(os.getenv("NEO4J_INDEX_WAIT_SECONDS", "300")) # How long ensure_schema waits for ONLINE
+ENTITY_MATCH_TOP_K = int(os.getenv("ENTITY_MATCH_TOP_K", "5")) # Entities matched per question entity
+FACTS_PER_MATCHED_ENTITY = int(os.getenv("FACTS_PER_MATCHED_ENTITY", "25")) # Caps what a hub node can contribute
+FACTS_TOKEN_BUDGET = int(os.getenv("FACTS_TOKEN_BUDGET", "1500")) # Facts passed to get_rag_response (~4 chars/token)
+
+# Fact ranking: full-text match score (relative to the best match for the same
+# question entity) plus bonuses for predicates matching the question's relationships
+# and for well-connected entities
+FACT_RELATION_WEIGHT = 0.5
+FACT_DEGREE_WEIGHT = 0.2
+
+# Constraints and indexes the graph relies on, by name. All are idempotent (IF NOT EXISTS).
+# The uniqueness constraint also backs MERGE (:Entity {name: ...}) with an index lookup.
+SCHEMA_STATEMENTS = {
+    "entity_name_unique": "CREATE CONSTRAINT entity_name_unique IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
+    "relation_type": "CREATE INDEX relation_type IF NOT EXISTS FOR ()-[r:RELATION]-() ON (r.type)",
+    "entity_name_fulltext": "CREATE FULLTEXT INDEX entity_name_fulltext IF NOT EXISTS FOR (e:Entity) ON EACH [e.name]",
+}
+
+# Lucene query syntax characters, escaped in user-supplied entity names
+LUCENE_SPECIAL_CHARS = re.compile(r'([+\-!(){}\[\]^"~*?:\\/&|])')
+LUCENE_OPERATORS = {"AND", "OR", "NOT", "TO"}
+
+_schema_ready = False
+
+# One round trip for all question entities: for each, the top-k full-text matches,
+# their degree, and at most $facts_per_entity relationships (either direction),
+# preferring predicates that mention the question's relationship terms
+FACTS_QUERY = """
+UNWIND $searches AS search
+CALL {
+    WITH search
+    CALL db.index.fulltext.queryNodes('entity_name_fulltext', search.query) YIELD node, score
+    RETURN node AS e, score
+    ORDER BY score DESC
+    LIMIT $top_k
+}
+WITH search, e, score, COUNT { (e)--() } AS degree
+CALL {
+    WITH e
+    MATCH (e)-[r:RELATION]-()
+    WITH r, size([t IN $relation_terms WHERE toLower(r.type) CONTAINS t]) AS relation_hits
+    ORDER BY relation_hits DESC
+    LIMIT $facts_per_entity
+    RETURN startNode(r).name AS subject, r.type AS predicate, endNode(r).name AS object, relation_hits
+}
+RETURN search.entity AS entity, score, degree, subject, predicate, object, relation_hits
+"""
+
+INSERT_TRIPLETS_QUERY = """
+UNWIND $rows AS row
+MERGE (s:Entity {name: row.subject})
+MERGE (o:Entity {name: row.object})
+MERGE (s)-[:RELATION {type: row.predicate}]->(o)
+"""
 
 # Initialize Neo4j Driver (this should be done once globally or on app startup)
 # The driver manages the connection pool.
@@ -20,54 +80,200 @@ except Exception as e:
     print(f"ERROR (neo4j_handler.py): Failed to connect to Neo4j: {e}")
     neo4j_driver = None # Set to None if connection fails to avoid further errors
 
-def insert_triplet_to_neo4j(driver, subject, predicate, object):
+def get_schema_state(driver):
     """
-    Inserts a subject-predicate-object triplet as nodes and a relationship in Neo4j.
-    Uses MERGE to create nodes/relationships if they don't exist, preventing duplicates.
+    Returns the current constraints and indexes with their state, for inspection.
     """
     if not driver:
-        print("ERROR (neo4j_handler.py): Neo4j driver not initialized. Cannot insert triplet.")
-        return
+        print("ERROR (neo4j_handler.py): Neo4j driver not initialized. Cannot read schema.")
+        return {"constraints": [], "indexes": []}
 
     with driver.session() as session:
-        session.execute_write(
-            lambda tx: tx.run(
-                """
-                MERGE (s:Entity {name: $subject})
-                MERGE (o:Entity {name: $object})
-                MERGE (s)-[:RELATION {type: $predicate}]->(o)
-                """,
-                subject=subject,
-                predicate=predicate,
-                object=object
-            )
+        constraints = session.run(
+            "SHOW CONSTRAINTS YIELD name, type, entityType, labelsOrTypes, properties, ownedIndex"
+        ).data()
+        indexes = session.run(
+            "SHOW INDEXES YIELD name, state, populationPercent, type, entityType, labelsOrTypes, properties, owningConstraint"
+        ).data()
+    return {"constraints": constraints, "indexes": indexes}
+
+def ensure_schema(driver, wait_seconds=NEO4J_INDEX_WAIT_SECONDS):
+    """
+    Creates the constraints and indexes in SCHEMA_STATEMENTS if missing and waits until they are ONLINE.
+    Returns True when every index is ONLINE.
+    """
+    global _schema_ready
+    if not driver:
+        print("ERROR (neo4j_handler.py): Neo4j driver not initialized. Cannot create schema.")
+        return False
+
+    with driver.session() as session:
+        for name, statement in SCHEMA_STATEMENTS.items():
+            try:
+                session.run(statement).consume()
+            except Exception as e:
+                print(f"ERROR (neo4j_handler.py): Failed to create '{name}': {e}")
+        try:
+            session.run("CALL db.awaitIndexes($timeout)", timeout=wait_seconds).consume()
+        except Exception as e:
+            print(f"ERROR (neo4j_handler.py): Indexes not online after {wait_seconds}s: {e}")
+
+    # Constraints are served by an index of the same name
+    states = {i["name"]: i["state"] for i in get_schema_state(driver)["indexes"]}
+    not_online = {name: states.get(name, "MISSING") for name in SCHEMA_STATEMENTS if states.get(name) != "ONLINE"}
+    if not_online:
+        print(f"ERROR (neo4j_handler.py): Schema not ready: {not_online}")
+    else:
+        print(f"DEBUG (neo4j_handler.py): Schema ONLINE: {', '.join(SCHEMA_STATEMENTS)}")
+    _schema_ready = not not_online
+    return _schema_ready
+
+def triplet_rows(triplets):
+    """
+    Converts extracted triplet dicts into UNWIND rows, dropping duplicates and malformed triplets.
+    Returns (rows, skipped_count).
+    """
+    rows = []
+    seen = set()
+    skipped = 0
+    for t in triplets:
+        row = {
+            "subject": str(t.get('subject', '') or '').strip(),
+            "predicate": str(t.get('predicate', '') or '').strip(),
+            "object": str(t.get('object', '') or '').strip(),
+        } if isinstance(t, dict) else {}
+        if not (row.get("subject") and row.get("predicate") and row.get("object")):
+            print(f"DEBUG (neo4j_handler.py): Skipping malformed triplet: {t}")
+            skipped += 1
+            continue
+        key = (row["subject"], row["predicate"], row["object"])
+        if key not in seen:
+            seen.add(key)
+            rows.append(row)
+    return rows, skipped
+
+def insert_triplets_to_neo4j(driver, triplets, batch_size=NEO4J_WRITE_BATCH_SIZE, progress_callback=None):
+    """
+    Inserts many triplets using one session and one UNWIND transaction per batch of `batch_size` rows.
+    `progress_callback(inserted, total)` is called after each batch.
+    Returns {"inserted", "skipped", "batches"}, where batches holds each batch's row count and seconds.
+    """
+    if not driver:
+        print("ERROR (neo4j_handler.py): Neo4j driver not initialized. Cannot insert triplets.")
+        return {"inserted": 0, "skipped": 0, "batches": []}
+
+    # MERGE without the Entity.name constraint is a label scan per row
+    if not _schema_ready and not ensure_schema(driver):
+        raise RuntimeError("Neo4j constraints/indexes are not ONLINE; refusing to ingest")
+
+    rows, skipped = triplet_rows(triplets)
+    batch_size = max(1, batch_size)
+    batches = []
+    with driver.session() as session:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            started = time.perf_counter()
+            session.execute_write(lambda tx: tx.run(INSERT_TRIPLETS_QUERY, rows=batch).consume())
+            seconds = time.perf_counter() - started
+            batches.append({"rows": len(batch), "seconds": round(seconds, 3)})
+            print(f"DEBUG (neo4j_handler.py): Batch {len(batches)}: wrote {len(batch)} triplets in {seconds:.2f}s "
+                  f"({start + len(batch)}/{len(rows)})")
+            if progress_callback:
+                progress_callback(start + len(batch), len(rows))
+    return {"inserted": len(rows), "skipped": skipped, "batches": batches}
+
+def entity_fulltext_query(name):
+    """
+    Builds a Lucene query for entity_name_fulltext: the exact phrase ranks highest,
+    then exact terms, then fuzzy terms (edit distance 1-2) to absorb typos and inflections.
+    """
+    # Drop bare operators (only upper case ones are operators to Lucene; "and"/"or"
+    # are ordinary indexed words) and punctuation-only tokens, escape the rest
+    words = [w for w in name.split() if w not in LUCENE_OPERATORS and re.search(r"\w", w)]
+    if not words:
+        return None
+    terms = [LUCENE_SPECIAL_CHARS.sub(r"\\\1", w) for w in words]
+    clauses = [f'"{" ".join(terms)}"^4'] if len(terms) > 1 else []
+    for word, term in zip(words, terms):
+        clauses.append(f"{term}^2")
+        if len(word) >= 4:
+            clauses.append(f"{term}~")
+    return " OR ".join(clauses)
+
+def relation_terms(relationships):
+    """
+    Lower-cased words of the question's relationships, e.g. ["works at"] -> ["works"].
+    """
+    terms = set()
+    for relationship in relationships or []:
+        terms.update(w for w in re.findall(r"\w+", str(relationship).lower()) if len(w) >= 3 and w not in {"the", "and", "for"})
+    return sorted(terms)
+
+def rank_facts(records, token_budget=FACTS_TOKEN_BUDGET):
+    """
+    Scores fact records from FACTS_QUERY, drops duplicates (keeping the best score) and
+    returns fact strings in rank order until the token budget is spent.
+    """
+    best_match = {}
+    max_degree = 1
+    for record in records:
+        best_match[record["entity"]] = max(best_match.get(record["entity"], 0.0), record["score"])
+        max_degree = max(max_degree, record["degree"])
+
+    ranked = {}
+    for record in records:
+        if not (record["subject"] and record["predicate"] and record["object"]):
+            continue
+        rank = (
+            record["score"] / (best_match[record["entity"]] or 1.0)
+            + FACT_RELATION_WEIGHT * min(record["relation_hits"], 1)
+            + FACT_DEGREE_WEIGHT * math.log1p(record["degree"]) / math.log1p(max_degree)
         )
+        fact = f"({record['subject']})-[:{record['predicate']}]->({record['object']})"
+        ranked[fact] = max(rank, ranked.get(fact, 0.0))
 
-def query_neo4j_for_facts(driver, entities):
+    facts = []
+    used = 0
+    for fact in sorted(ranked, key=ranked.get, reverse=True):
+        cost = (len(fact) + 3) // 4 + 1 # +1 for the joining newline
+        if used + cost > token_budget:
+            break
+        facts.append(fact)
+        used += cost
+    return facts
+
+def query_neo4j_for_facts(driver, entities, relationships=None, token_budget=FACTS_TOKEN_BUDGET):
     """
-    Queries Neo4j for facts (triplets) related to the given list of entities.
+    Queries Neo4j for facts (triplets) related to the given list of entities in a single round trip.
+    Facts are ranked by entity match score, relevance to `relationships` and entity degree,
+    deduplicated, and cut off at `token_budget`.
     """
     if not driver:
         print("ERROR (neo4j_handler.py): Neo4j driver not initialized. Cannot query for facts.")
         return []
 
-    collected_results = set() # Use a set to avoid duplicate facts
+    searches = []
+    for entity_name in entities:
+        query = entity_fulltext_query(str(entity_name))
+        if query:
+            searches.append({"entity": str(entity_name), "query": query})
+    if not searches:
+        return []
+
+    terms = relation_terms(relationships)
+    print(f"DEBUG (neo4j_handler.py): Querying Neo4j for entities: {[s['entity'] for s in searches]}, relation terms: {terms}")
+    started = time.perf_counter()
     with driver.session() as session:
-        for entity_name in entities:
-            # Query for nodes whose names contain the entity_name (case-insensitive)
-            # and any relationships connected to them.
-            print(f"DEBUG (neo4j_handler.py): Querying Neo4j for entity: '{entity_name}'")
-            query = """
-            MATCH (e:Entity)
-            WHERE toLower(e.name) CONTAINS toLower($name)
-            OPTIONAL MATCH (e)-[r]->(n)
-            RETURN e.name AS subject, type(r) AS predicate, n.name AS object
-            
-            """
-            result = session.run(query, name=entity_name)
-            for record in result:
-                # Format retrieved data as a string triplet for the RAG context
-                if record['subject'] and record['predicate'] and record['object']:
-                    fact = f"({record['subject']})-[:{record['predicate']}]->({record['object']})"
-                    collected_results.add(fact)
-    return list(collected_results) # Convert back to list for consistent return type
\ No newline at end of file
+        records = session.execute_read(
+            lambda tx: tx.run(
+                FACTS_QUERY,
+                searches=searches,
+                relation_terms=terms,
+                top_k=ENTITY_MATCH_TOP_K,
+                facts_per_entity=FACTS_PER_MATCHED_ENTITY,
+            ).data()
+        )
+    facts = rank_facts(records, token_budget)
+    print(f"DEBUG (neo4j_handler.py): {len(records)} candidate facts, kept {len(facts)} "
+          f"in {time.perf_counter() - started:.2f}s")
+    return facts
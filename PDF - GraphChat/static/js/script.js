@@ -52,12 +52,25 @@ document.addEventListener('DOMContentLoaded', function() {
             formData.append('pdf_files', file);
         }
 
+        // Poll chunk progress while the upload request is being processed
+        const progressTimer = setInterval(async () => {
+            try {
+                const progress = await (await fetch('/upload_progress')).json();
+                if (progress.total_chunks > 0) {
+                    uploadStatus.textContent = `Extracting triplets... ${progress.processed_chunks}/${progress.total_chunks} chunks`;
+                }
+            } catch (error) {
+                console.error('Progress error:', error);
+            }
+        }, 1000);
+
         try {
             const response = await fetch('/upload_pdf', {
                 method: 'POST',
                 body: formData
             });
             const data = await response.json();
+            clearInterval(progressTimer);
 
             if (data.status === 'success') {
                 uploadStatus.textContent = data.message;
@@ -74,6 +87,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 uploadStatus.classList.add('error');
             }
         } catch (error) {
+            clearInterval(progressTimer);
             uploadStatus.textContent = `Error: ${error.message}`;
             uploadStatus.classList.add('error');
             console.error('Upload error:', error);
@@ -8,6 +8,7 @@ from langchain.prompts import PromptTemplate # Keep PromptTemplate for structuri
 from openai import OpenAI
 
 from neo4j import GraphDatabase
+from services.neo4j_handler import ensure_schema, get_schema_state, insert_triplets_to_neo4j
 import json
 from dotenv import load_dotenv
 import os
@@ -99,21 +100,6 @@ def extract_triplets(text_chunk):
         st.error(f"Error in extract_triplets: {e}")
         return []
 
-def insert_triplet_to_neo4j(driver, subject, predicate, object):
-    with driver.session() as session:
-        session.execute_write(
-            lambda tx: tx.run(
-                """
-                MERGE (s:Entity {name: $subject})
-                MERGE (o:Entity {name: $object})
-                MERGE (s)-[:RELATION {type: $predicate}]->(o)
-                """,
-                subject=subject,
-                predicate=predicate,
-                object=object
-            )
-        )
-
 def extract_entities_from_question(question):
     prompt_template_str = """
     You are an expert at identifying key entities and relationships from a user's question to facilitate a knowledge graph lookup.
@@ -201,21 +187,22 @@ def process_pdf_to_graph(pdf_docs):
             return ""
 
         neo4j_progress_bar = st.progress(0)
-        for i, t in enumerate(all_triplets):
-            try:
-                # Ensure subject, predicate, object are strings before inserting
-                sub = str(t.get('subject', ''))
-                pred = str(t.get('predicate', ''))
-                obj = str(t.get('object', ''))
-                
-                if sub and pred and obj: # Only insert if all parts are non-empty strings
-                    insert_triplet_to_neo4j(neo4j_driver, sub, pred, obj)
-                else:
-                    st.warning(f"Skipping malformed triplet: {t}")
-                    
-                neo4j_progress_bar.progress((i + 1) / len(all_triplets))
-            except Exception as e:
-                st.error(f"Error inserting triplet {t} into Neo4j: {e}")
+        try:
+            if not ensure_schema(neo4j_driver):
+                st.error("Neo4j constraints/indexes are not ONLINE yet.")
+                st.json(get_schema_state(neo4j_driver)["indexes"])
+                return raw_text
+            summary = insert_triplets_to_neo4j(
+                neo4j_driver, all_triplets,
+                progress_callback=lambda done, total: neo4j_progress_bar.progress(done / total)
+            )
+            for i, batch in enumerate(summary["batches"]):
+                st.caption(f"Batch {i + 1}: {batch['rows']} triplets in {batch['seconds']:.2f}s")
+            if summary["skipped"]:
+                st.warning(f"Skipped {summary['skipped']} malformed triplets.")
+        except Exception as e:
+            st.error(f"Error inserting triplets into Neo4j: {e}")
+            return raw_text
 
         st.success("Neo4j Graph Generated successfully!")
     
@@ -0,0 +1,38 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.neo4j_handler import entity_fulltext_query
+
+
+def test_single_word_gets_exact_and_fuzzy_terms():
+    assert entity_fulltext_query("Neo4j") == "Neo4j^2 OR Neo4j~"
+
+
+def test_short_words_are_not_fuzzy():
+    assert entity_fulltext_query("AI") == "AI^2"
+
+
+def test_multi_word_name_boosts_the_phrase():
+    assert entity_fulltext_query("Apple Inc") == '"Apple Inc"^4 OR Apple^2 OR Apple~ OR Inc^2'
+
+
+def test_lowercase_connectives_are_kept():
+    query = entity_fulltext_query("Bread and Butter")
+    assert query.startswith('"Bread and Butter"^4')
+    assert "and^2" in query
+
+
+def test_uppercase_operators_are_dropped():
+    assert entity_fulltext_query("Salt AND Pepper") == '"Salt Pepper"^4 OR Salt^2 OR Salt~ OR Pepper^2 OR Pepper~'
+    assert entity_fulltext_query("OR") is None
+
+
+def test_special_characters_are_escaped():
+    assert entity_fulltext_query("C++ (lang)") == r'"C\+\+ \(lang\)"^4 OR C\+\+^2 OR \(lang\)^2 OR \(lang\)~'
+    assert entity_fulltext_query("a:b") == r"a\:b^2"
+
+
+def test_punctuation_only_input_gives_no_query():
+    assert entity_fulltext_query("&& || !") is None
+    assert entity_fulltext_query("   ") is None
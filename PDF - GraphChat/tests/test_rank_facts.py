@@ -0,0 +1,67 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.neo4j_handler import rank_facts, relation_terms
+
+
+def record(entity, score, degree, subject, predicate, obj, relation_hits=0):
+    return {
+        "entity": entity,
+        "score": score,
+        "degree": degree,
+        "subject": subject,
+        "predicate": predicate,
+        "object": obj,
+        "relation_hits": relation_hits,
+    }
+
+
+def test_relation_terms():
+    assert relation_terms(["works at", "founded by the"]) == ["founded", "works"]
+    assert relation_terms(None) == []
+
+
+def test_better_match_ranks_first():
+    facts = rank_facts([
+        record("Apple", 1.0, 3, "Apple pie", "is", "food"),
+        record("Apple", 3.0, 3, "Apple", "makes", "iPhone"),
+    ])
+    assert facts == ["(Apple)-[:makes]->(iPhone)", "(Apple pie)-[:is]->(food)"]
+
+
+def test_relation_match_outranks_plain_fact():
+    facts = rank_facts([
+        record("Apple", 2.0, 3, "Apple", "located in", "Cupertino"),
+        record("Apple", 2.0, 3, "Apple", "founded by", "Jobs", relation_hits=1),
+    ])
+    assert facts[0] == "(Apple)-[:founded by]->(Jobs)"
+
+
+def test_scores_are_relative_per_entity():
+    # The best match of each question entity scores the same, whatever its raw score
+    facts = rank_facts([
+        record("Apple", 10.0, 1, "Apple", "makes", "iPhone"),
+        record("Jobs", 1.0, 1, "Jobs", "born in", "1955"),
+        record("Apple", 2.0, 1, "Apple Records", "signed", "Beatles"),
+    ])
+    assert facts[-1] == "(Apple Records)-[:signed]->(Beatles)"
+
+
+def test_duplicates_are_merged():
+    facts = rank_facts([
+        record("Apple", 3.0, 5, "Apple", "founded by", "Jobs"),
+        record("Jobs", 2.0, 5, "Apple", "founded by", "Jobs"),
+    ])
+    assert facts == ["(Apple)-[:founded by]->(Jobs)"]
+
+
+def test_incomplete_records_are_skipped():
+    assert rank_facts([record("Apple", 1.0, 0, "Apple", None, None)]) == []
+
+
+def test_token_budget_cuts_lowest_ranked():
+    records = [record("Apple", 10.0 - i, 1, "Apple", "has", f"thing {i}") for i in range(10)]
+    facts = rank_facts(records, token_budget=20)
+    assert facts == ["(Apple)-[:has]->(thing 0)", "(Apple)-[:has]->(thing 1)"]
+    assert rank_facts(records, token_budget=0) == []